@@ -0,0 +1,164 @@
+"""
+    Anytime solver: some solution right away, better ones while time is left.
+
+    Greedy best first search on a destination distance heuristic finds a first solution
+    quickly. Weighted A* then runs again at lower and lower weights, each pass only looking
+    for solutions shorter than the best one so far, and a final breadth first search bounded
+    by that length either finds the shortest solution or proves the best one is.
+
+    Solutions come out of a generator as they improve. They carry exact=False while they
+    may still be longer than the shortest one; the last one has exact=True if the search
+    finished within the time limit.
+
+    Usage: python anytime.py board.csv [seconds]
+"""
+
+import heapq
+import sys
+import time
+from collections import deque
+
+from solve import Solver, UnsolvableError, Solution
+from visited import StatePacker
+
+GREEDY = None # weight of the first pass: ignore the moves made so far
+WEIGHTS = (GREEDY, 5.0, 3.0, 2.0, 1.5, 1.0)
+
+
+class TimeUp(Exception):
+    pass
+
+
+def destination_distance(board, status):
+    """
+        Per color, the farthest block from its nearest destination, summed over colors.
+        Blocks are pushed by others and teleported, so this guides but does not bound.
+    """
+    h = 0
+    for c in status.colors():
+        destinations = board.destinations(c)
+        if not destinations: # a color that has to be painted away
+            continue
+        h += max(min(abs(i - di) + abs(j - dj) for di, dj in destinations) for i, j in status.positions(c))
+    return h
+
+
+class AnytimeSolver:
+
+    def __init__(self, board, weights=WEIGHTS, heuristic=destination_distance):
+        self.solver = Solver(board)
+        self.packer = StatePacker(self.solver.board, self.solver.init_status)
+        self.weights = weights
+        self.heuristic = heuristic # (board, status) -> estimate, or None for a state that can't be finished
+        self.deadline = None
+        self.stats = {'expanded': 0}
+
+    def _check_time(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise TimeUp()
+
+    def _successors(self, status):
+        # every state, merged blocks and blocks off the board included: the final pass is only exact if none is left out
+        for color in sorted(status.colors()):
+            new_status = self.solver._move(status, color)
+            yield color, new_status, self.packer.pack(new_status)
+
+    def best_first(self, weight, bound=None):
+        """
+            Best first search on g + weight * h (h alone for GREEDY), for a solution of fewer
+            than bound moves. Returns the moves, or None when there is none.
+        """
+        board = self.solver.board
+        init_status = self.solver.init_status
+        best_g = {self.packer.pack(init_status): 0}
+        order = 0 # ties go first in, first out, which keeps the search reproducible
+        heap = [(0, order, init_status, "")]
+        while heap:
+            f, o, status, path = heapq.heappop(heap)
+            if status.finished(board):
+                return path
+            g = len(path)
+            if bound is not None and g + 1 >= bound:
+                continue
+            self._check_time()
+            self.stats['expanded'] += 1
+            for color, new_status, key in self._successors(status):
+                new_g = g + len(color) # a successor can be a run of moves, see macros.py
+                if bound is not None and new_g >= bound or best_g.get(key, new_g + 1) <= new_g:
+                    continue
+                best_g[key] = new_g
+                h = self.heuristic(board, new_status)
+                if h is None:
+                    continue
+                order += 1
+                f = h if weight is GREEDY else new_g + weight * h
+                heapq.heappush(heap, (f, order, new_status, path + color))
+        return None
+
+    def bounded_bfs(self, bound=None):
+        """Breadth first search for a solution of fewer than bound moves; the one found is the shortest."""
+        board = self.solver.board
+        init_status = self.solver.init_status
+        seen = set([self.packer.pack(init_status)])
+        q = deque([(init_status, "")])
+        while q:
+            status, path = q.popleft()
+            if status.finished(board):
+                return path
+            if bound is not None and len(path) + 1 >= bound:
+                continue
+            self._check_time()
+            self.stats['expanded'] += 1
+            for color, new_status, key in self._successors(status):
+                if key not in seen:
+                    seen.add(key)
+                    q.append((new_status, path + color))
+        return None
+
+    def solve(self, time_limit=None):
+        """Yield better and better solutions until the shortest one is known or time is up."""
+        self.deadline = None if time_limit is None else time.time() + time_limit
+        best = None
+        try:
+            for weight in self.weights:
+                found = self.best_first(weight, None if best is None else len(best))
+                if found is not None:
+                    best = Solution(found)
+                    best.exact = False
+                    yield best
+            found = self.bounded_bfs(None if best is None else len(best))
+        except TimeUp:
+            if best is None:
+                raise UnsolvableError(exact=False)
+            return
+        if found is not None:
+            yield Solution(found)
+        elif best is None:
+            raise UnsolvableError()
+        else: # nothing shorter exists, the best one so far is optimal
+            yield Solution(best)
+
+
+def solve_anytime(board, time_limit=None, callback=None, weights=WEIGHTS):
+    """Run the anytime search, passing each better solution to callback. Returns the last one."""
+    best = None
+    for best in AnytimeSolver(board, weights).solve(time_limit):
+        if callback is not None:
+            callback(best)
+    return best
+
+
+if __name__ == '__main__':
+    from cli import format_solution
+    from solve import read_board
+
+    start = time.time()
+
+    def report(solution):
+        sys.stdout.write('%.3fs %d moves%s: %s\n' % (time.time() - start, len(solution), '' if solution.exact else ' (maybe not shortest)', format_solution(solution)))
+        sys.stdout.flush()
+
+    try:
+        solve_anytime(read_board(sys.argv[1]), float(sys.argv[2]) if len(sys.argv) > 2 else None, report)
+    except UnsolvableError as e:
+        sys.exit('unsolvable' if e.exact else 'no solution found in time')
@@ -0,0 +1,76 @@
+"""
+    Shared memory arena of packed states.
+
+    States are fixed-width records, a `StatePacker` key and whatever the caller keeps after
+    it, laid end to end in one `multiprocessing.shared_memory` block, so processes hand
+    each other state indices instead of pickled Status objects. A header counts the states
+    appended so far; appending takes a lock only to reserve slots, the records are written
+    without it.
+
+    `view` returns a zero-copy memoryview of one record. Views point into the shared block
+    and must be released (or dropped) before the arena is closed.
+"""
+
+import struct
+from multiprocessing import Lock, shared_memory
+
+_HEADER = struct.Struct('<Q') # number of states appended
+
+
+class StateArena:
+
+    def __init__(self, width, capacity, name=None, lock=None):
+        self.width = width
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + capacity * width)
+            self.owner = True
+        else:
+            self.shm = attach(name)
+            self.owner = False
+        self.buf = self.shm.buf
+        self.lock = lock or Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def reserve(self, n):
+        """Reserve n consecutive slots, returning the index of the first one."""
+        with self.lock:
+            first = _HEADER.unpack_from(self.buf, 0)[0]
+            if first + n > self.capacity:
+                raise MemoryError('state arena full: %d states' % self.capacity)
+            _HEADER.pack_into(self.buf, 0, first + n)
+        return first
+
+    def write(self, index, key):
+        offset = _HEADER.size + index * self.width
+        self.buf[offset:offset + self.width] = key
+
+    def append(self, key):
+        index = self.reserve(1)
+        self.write(index, key)
+        return index
+
+    def view(self, index):
+        offset = _HEADER.size + index * self.width
+        return self.buf[offset:offset + self.width]
+
+    def __len__(self):
+        return _HEADER.unpack_from(self.buf, 0)[0]
+
+    def close(self):
+        self.buf.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        # older versions register the block again with the resource tracker the workers share with the parent,
+        # which is harmless: the parent unlinks it once at the end
+        return shared_memory.SharedMemory(name=name)
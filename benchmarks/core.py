@@ -0,0 +1,77 @@
+"""
+    The search core interpreted and compiled, side by side.
+
+    Every board is solved with core.py run by the interpreter, then with the extension mypyc
+    or Cython built from it in place (see core.py), when there is one. Both must find the
+    same solution. Times are the best of the repeats, with the states expanded a second.
+
+    Usage: python benchmarks/core.py board.csv... [--repeat N]
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core
+import solve
+from solve import Solver, UnsolvableError, read_board
+
+
+def load_interpreted():
+    # the source, whatever `import core` picks
+    spec = importlib.util.spec_from_file_location('core_interpreted', os.path.join(ROOT, 'core.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(module, board, repeat):
+    """(solution or None, states expanded, best seconds) of solving board with module as the core."""
+    solve.core = module
+    try:
+        best = None
+        for k in range(repeat):
+            solver = Solver(board)
+            start = time.perf_counter()
+            try:
+                solution = str(solver.solve())
+            except UnsolvableError:
+                solution = None
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        return solution, solver.stats['expanded'], best
+    finally:
+        solve.core = core
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    repeat = int(args.pop(args.index('--repeat') + 1)) if '--repeat' in args else 3
+    if '--repeat' in args:
+        args.remove('--repeat')
+    if not args:
+        sys.exit(__doc__)
+
+    cores = [('interpreted', load_interpreted())]
+    if core.COMPILED:
+        cores.append(('compiled', core))
+    else:
+        sys.stdout.write('no compiled core next to core.py, build one with `mypyc core.py` or `cythonize -i -3 core.py`\n')
+
+    sys.stdout.write('%-24s %10s %14s %10s %14s %8s\n' % ('board', 'expanded', 'interpreted', '', 'compiled', 'speedup'))
+    for filename in args:
+        board = read_board(filename)
+        results = [timed(module, board, repeat) for name, module in cores]
+        solution, expanded, seconds = results[0]
+        row = '%-24s %10d %9.3fs %9.0f/s' % (os.path.basename(filename), expanded, seconds, expanded / max(seconds, 1e-9))
+        if len(results) > 1:
+            compiled_solution, compiled_expanded, compiled_seconds = results[1]
+            if (compiled_solution, compiled_expanded) != (solution, expanded):
+                sys.exit('%s: the compiled core found %r after %d states, the interpreted %r after %d'
+                         % (filename, compiled_solution, compiled_expanded, solution, expanded))
+            row += ' %9.3fs %9.0f/s %7.1fx' % (compiled_seconds, expanded / max(compiled_seconds, 1e-9), seconds / max(compiled_seconds, 1e-9))
+        sys.stdout.write(row + '\n')
@@ -0,0 +1,142 @@
+"""
+    Rules profiles against the versions they stand for.
+
+    For every board and every version in versions/ that loads it, random walks replay the
+    same moves on the version's solver and on Solver with the version's profile, and the
+    blocks must match after every move. Then both solve the board, timed.
+
+    Usage: python benchmarks/profiles.py board.csv... [--walks N] [--steps N]
+
+    A version and its profile must also agree on which boards they refuse to load.
+"""
+
+import importlib.util
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rules import PROFILES
+from solve import Solver, UnsolvableError, read_board
+
+VERSIONS = ['0.1', '0.2', '0.3', '0.4', '0.5', '0.51']
+
+
+def load_version(version):
+    path = os.path.join(ROOT, 'versions', version, 'solve.py')
+    spec = importlib.util.spec_from_file_location('solve_' + version.replace('.', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def blocks(status):
+    # (color, pos, facing) of every block, for the one block per color Status of 0.1 too
+    if not hasattr(status, 'pos'): # the flat Status of solve.py
+        return sorted((c, pos, status.facing(pos)) for c in status.colors() for pos in status.positions(c))
+    if status.pos and not isinstance(next(iter(status.pos.values())), list):
+        return sorted((c, status.pos[c], status.facing_map[c]) for c in status.pos)
+    return sorted((c, pos, status.facing_map[pos]) for c in status.pos for pos in set(status.pos[c]))
+
+
+def _load(make):
+    try:
+        return make(), None
+    except (AssertionError, ValueError) as e:
+        return None, e
+
+
+def _step(solver, status, color):
+    try:
+        return solver._move(status, color), None
+    except Exception as e: # versions crash on some portal exits, the profile must crash alike
+        return None, type(e).__name__
+
+
+def compare_moves(version_solver, profile_solver, walks, steps, seed=0):
+    """Replay random walks on both solvers, returning the number of moves checked and the mismatches."""
+    rnd = random.Random(seed)
+    checked = 0
+    mismatches = []
+    for walk in range(walks):
+        old, new = version_solver.q.queue[0], profile_solver.init_status
+        moves = ''
+        for i in range(steps):
+            color = rnd.choice(sorted(new.colors()))
+            moves += color
+            old, old_error = _step(version_solver, old, color)
+            new, new_error = _step(profile_solver, new, color)
+            checked += 1
+            if old_error or new_error:
+                if old_error != new_error:
+                    mismatches.append((moves, old_error, new_error))
+                break
+            if blocks(old) != blocks(new):
+                mismatches.append((moves, blocks(old), blocks(new)))
+                break
+    return checked, mismatches
+
+
+def timed_solve(solver, unsolvable=UnsolvableError):
+    # unsolvable: the exception class of the solver's own module, every version defines its own
+    start = time.perf_counter()
+    solution = error = None
+    try:
+        solution = solver.solve()
+    except unsolvable:
+        pass
+    except Exception as e: # as in _step, a version may crash on a portal exit, the profile must crash alike
+        error = type(e).__name__
+    return solution, error, time.perf_counter() - start
+
+
+def _length(solution, error):
+    return error or (None if solution is None else len(solution))
+
+
+def main():
+    args = sys.argv[1:]
+    walks, steps = 50, 30
+    if '--walks' in args:
+        walks = int(args.pop(args.index('--walks') + 1))
+        args.remove('--walks')
+    if '--steps' in args:
+        steps = int(args.pop(args.index('--steps') + 1))
+        args.remove('--steps')
+
+    modules = dict((version, load_version(version)) for version in VERSIONS)
+    failed = False
+    print('%-24s %-5s %8s %10s %10s %9s %9s' % ('board', 'ver', 'moves', 'mismatch', 'length', 'version', 'profile'))
+    for filename in args:
+        board = read_board(filename)
+        for version in VERSIONS:
+            version_solver, version_error = _load(lambda: modules[version].Solver(board))
+            profile_solver, profile_error = _load(lambda: Solver(board, rules=PROFILES[version]))
+            if (version_solver is None) != (profile_solver is None):
+                failed = True
+                print('%-24s %-5s loads differ: version %r, profile %r' % (os.path.basename(filename), version, version_error, profile_error))
+                continue
+            if version_solver is None:
+                continue
+            checked, mismatches = compare_moves(version_solver, Solver(board, rules=PROFILES[version]), walks, steps)
+            failed = failed or bool(mismatches)
+
+            # fresh solvers, the walks have not touched their queues but keep the timing clean
+            old_solution, old_error, old_time = timed_solve(modules[version].Solver(board), modules[version].UnsolvableError)
+            new_solution, new_error, new_time = timed_solve(Solver(board, rules=PROFILES[version]))
+            old_length, new_length = _length(old_solution, old_error), _length(new_solution, new_error)
+            lengths = '%s/%s' % (old_length, new_length)
+            if old_length != new_length:
+                failed = True
+            print('%-24s %-5s %8d %10d %10s %8.3fs %8.3fs' % (os.path.basename(filename), version, checked, len(mismatches), lengths, old_time, new_time))
+            for mismatch in mismatches[:3]:
+                print('    after %s: %r != %r' % mismatch)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
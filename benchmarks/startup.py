@@ -0,0 +1,81 @@
+"""
+    Cold start benchmark: how long `import solve` and a whole CLI run take in a fresh
+    interpreter, next to a bare `python -c pass` baseline.
+
+    Usage: python benchmarks/startup.py [runs]
+
+    Also prints the modules `import solve` pulls in, with their cumulative import time
+    from `python -X importtime`, so a heavy import sneaking into the engine shows up.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# one move away from solved, so the CLI run is all startup
+BOARD = """ER,,DR,,
+,,,,
+,,,,
+,,,,
+,,,,
+
+"""
+
+
+def run(args, runs):
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable] + args, cwd=ROOT, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def import_times():
+    """Cumulative import time of solve and everything imported because of it, in us."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import solve'],
+                            cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '): # a top level import, anything before it was not ours
+            if name.strip() == 'solve':
+                return rows + [(int(cumulative), name.rstrip())]
+            rows = []
+        else:
+            rows.append((int(cumulative), name.rstrip()))
+    return rows
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # measure a warm bytecode cache, as an installed solver would have
+    subprocess.check_call([sys.executable, '-m', 'compileall', '-q', os.path.join(ROOT, 'solve.py'), os.path.join(ROOT, 'cli.py')])
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write(BOARD)
+    try:
+        baseline = run(['-c', 'pass'], runs)
+        engine = run(['-c', 'import solve'], runs)
+        cli = run(['solve.py', f.name], runs)
+    finally:
+        os.unlink(f.name)
+
+    print('median of %d runs' % runs)
+    print('%-28s %8.1f ms' % ('python -c pass', baseline * 1000))
+    print('%-28s %8.1f ms  (+%.1f)' % ('import solve', engine * 1000, (engine - baseline) * 1000))
+    print('%-28s %8.1f ms  (+%.1f)' % ('python solve.py board.csv', cli * 1000, (cli - baseline) * 1000))
+    print()
+    print('modules imported by `import solve` (cumulative us):')
+    for cumulative, name in import_times():
+        print('%8d %s' % (cumulative, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+    Optimality certificates: what a breadth first search went through on its way to a
+    solution, in a file small enough to keep with the level and checked without trusting
+    the solver that wrote it.
+
+    Layer d holds the states first reached after d moves. The certificate has the size of
+    every layer up to the solution's length, and a digest of its states: the sum of a 64 bit
+    blake2b fingerprint of each state key, which needs no order and adds up across
+    processes. With the solution, the state it ends in, and digests of the board and of the
+    version it was solved under, that is a few hundred bytes of JSON for most levels.
+
+    No state before the last layer is finished, which makes the solution's length a lower
+    bound on the length of any solution. The verifier replays the solution, then rebuilds
+    the layers with a breadth first search of its own, slices of each layer expanded in a
+    process pool, and compares them with the certificate one at a time. --depth N rebuilds
+    only the first N layers, a quick spot check of the certificate before the big layers.
+
+    Usage: python certificate.py board.csv certificate.json [--processes N] [--depth N]
+"""
+
+import hashlib
+import json
+import sys
+from array import array
+
+from solve import Solver
+
+_MASK = (1 << 64) - 1
+
+
+def digest(keys):
+    """Order-free digest of a set of state keys, as an int below 2 ** 64."""
+    total = 0
+    for key in keys:
+        total += int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+    return total & _MASK
+
+
+def board_digest(board):
+    text = '\n'.join(','.join(row) for row in board)
+    return hashlib.blake2b(text.encode('ascii'), digest_size=16).hexdigest()
+
+
+def _blocks(status):
+    # the distinct blocks of status as sorted [row, column, facing and color] triples
+    names = status.symbols.colors.names
+    return [list(block) for block in sorted(set((i, j, status.facing((i, j)) + names[code])
+                                                for i, j, code in zip(status.blocks[0::4], status.blocks[1::4], status.blocks[2::4])))]
+
+
+def _replay(solver, solution):
+    status = solver.init_status
+    for color in solution:
+        if color not in status.colors():
+            raise ValueError('no %s block to move' % color)
+        status = solver._move(status, color)
+    return status
+
+
+def certify(board, solver, solution):
+    """
+        The certificate of solution, which solver.solve() just returned for board, as a dict
+        ready for json. Only the plain search keeps what it needs, the moves to every state
+        it reached.
+    """
+    if solution.status != 'solved':
+        raise ValueError('no certificate for a search stopped by its %s limit' % solution.status)
+    if not isinstance(solver.visited, dict):
+        raise ValueError('certificates need the plain search, not a compact or approximate one')
+    depth = len(solution)
+    # the search stops as it takes the solution out of the queue, every state of its layer is in by then
+    layers = [[] for d in range(depth + 1)]
+    for key, path in solver.visited.items():
+        if len(path) <= depth:
+            layers[len(path)].append(key)
+    return {
+        'board': board_digest(board),
+        'rules': solver.rules.name,
+        'solution': str(solution),
+        'final': _blocks(_replay(solver, solution)),
+        'layers': [[len(keys), '%016x' % digest(keys)] for keys in layers],
+    }
+
+
+def write_certificate(certificate, filename):
+    with open(filename, 'w') as f:
+        json.dump(certificate, f, sort_keys=True)
+        f.write('\n')
+
+
+def read_certificate(filename):
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+_solver = None
+
+
+def _init_worker(board, rules):
+    global _solver
+    _solver = Solver(board, rules=rules)
+
+
+def _expand(task):
+    """
+        Whether a state of a slice of a layer is finished, and with expand the (key, blocks)
+        of every state a move of the slice reaches.
+    """
+    part, expand = task
+    finished = False
+    children = []
+    for blocks in part:
+        status = _solver._status(array('h', blocks))
+        finished = finished or status.finished(_solver.board)
+        if expand:
+            for color in sorted(status.colors()):
+                child = _solver._move(status, color)
+                children.append((child._key(), child.blocks.tobytes()))
+    return finished, children
+
+
+def verify(board, certificate, processes=None, depth=None, chunk=256):
+    """
+        Check certificate against board, raising ValueError at the first claim that does not
+        hold. With depth only the first depth layers are rebuilt. Returns how many layers
+        and states were checked.
+    """
+    from rules import PROFILES
+
+    if certificate['board'] != board_digest(board):
+        raise ValueError('the certificate is of another board')
+    if certificate['rules'] not in PROFILES:
+        raise ValueError('no version %s to check under' % certificate['rules'])
+    rules = PROFILES[certificate['rules']]
+    solver = Solver(board, rules=rules)
+    solution = certificate['solution']
+    layers = certificate['layers']
+    if len(layers) != len(solution) + 1:
+        raise ValueError('%d layers for a solution of %d moves' % (len(layers), len(solution)))
+    final = _replay(solver, solution)
+    if not final.finished(solver.board):
+        raise ValueError('the solution does not finish the level')
+    if _blocks(final) != certificate['final']:
+        raise ValueError('the solution ends in another state')
+
+    last = len(layers) if depth is None else max(1, min(depth, len(layers)))
+    if processes == 1:
+        _init_worker(board, rules)
+        pool = None
+        run = map
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes, _init_worker, (board, rules))
+        run = pool.imap # in order: the first copy of a state is kept, as the solver kept it, its block order matters before 0.51
+    try:
+        key = solver.init_status._key()
+        seen = set([key])
+        layer = [(key, solver.init_status.blocks.tobytes())]
+        states = 0
+        for d in range(last):
+            count, expected = layers[d]
+            found = '%016x' % digest(key for key, blocks in layer)
+            if (len(layer), found) != (count, expected):
+                raise ValueError('layer %d has %d states of digest %s, not %d of %s' % (d, len(layer), found, count, expected))
+            states += len(layer)
+            if d == len(layers) - 1:
+                if final._key() not in set(key for key, blocks in layer):
+                    raise ValueError('the final state is not in the last layer')
+                break
+
+            # a finished state this early would be a shorter solution; the next layer is only needed to go on
+            expand = d + 1 < last
+            tasks = [([blocks for key, blocks in layer[first:first + chunk]], expand) for first in range(0, len(layer), chunk)]
+            next_layer = []
+            for finished, children in run(_expand, tasks):
+                if finished:
+                    raise ValueError('layer %d has a finished state, %d moves are not the fewest' % (d, len(solution)))
+                for key, blocks in children:
+                    if key not in seen:
+                        seen.add(key)
+                        next_layer.append((key, blocks))
+            layer = next_layer
+        return last, states
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+if __name__ == '__main__':
+    import time
+    from solve import read_board
+
+    args = sys.argv[1:]
+    processes = int(args.pop(args.index('--processes') + 1)) if '--processes' in args else None
+    if '--processes' in args:
+        args.remove('--processes')
+    depth = int(args.pop(args.index('--depth') + 1)) if '--depth' in args else None
+    if '--depth' in args:
+        args.remove('--depth')
+    if len(args) != 2:
+        sys.exit(__doc__)
+
+    start = time.time()
+    try:
+        layers, states = verify(read_board(args[0]), read_certificate(args[1]), processes, depth)
+    except ValueError as e:
+        sys.exit('rejected: %s' % e)
+    sys.stdout.write('%d layers, %d states checked in %.2fs\n' % (layers, states, time.time() - start))
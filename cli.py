@@ -0,0 +1,120 @@
+"""
+    Command line interface of the solver.
+
+    Kept apart from the engine so `import solve` stays cheap, and the optional engines are
+    only imported when the command line asks for them.
+"""
+
+import sys
+
+
+def format_solution(solution):
+    # groups of 4 moves are easier to follow on the phone
+    return ' '.join(solution[i:i + 4] for i in range(0, len(solution), 4))
+
+
+USAGE = """usage: python solve.py board.csv [options]
+
+options:
+  --engine scalar|bitboard  push simulation engine (default scalar); bitboard is slower,
+                            about 2x on an 8x8 board, it is there to check the other against
+  --compact                 keep visited states packed, far less memory
+  --approximate             Bloom filter visited set, may miss the shortest solution
+  --error-rate RATE         false positive rate of --approximate (default 0.001)
+  --all                     print every shortest solution, one per line
+  --time-limit SECONDS      stop after SECONDS, printing the best progress so far
+  --max-states N            stop once N states are kept
+  --max-memory MB           stop once the kept states take about MB megabytes
+  --certificate FILE        write a certificate that the solution is a shortest one,
+                            check it with certificate.py
+"""
+
+
+def parse_args(argv):
+    # argparse alone costs more than importing the whole engine, so options are parsed by hand
+    options = {'board': None, 'engine': 'scalar', 'compact': False, 'approximate': False, 'error_rate': 0.001, 'all': False,
+               'time_limit': None, 'max_states': None, 'max_memory': None, 'certificate': None}
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            sys.exit(0)
+        elif arg == '--compact':
+            options['compact'] = True
+        elif arg == '--approximate':
+            options['approximate'] = True
+        elif arg == '--all':
+            options['all'] = True
+        elif arg in ('--engine', '--error-rate', '--time-limit', '--max-states', '--max-memory', '--certificate') and args:
+            value = args.pop(0)
+            if arg == '--engine':
+                if value not in ('scalar', 'bitboard'):
+                    sys.exit(USAGE)
+                options['engine'] = value
+            elif arg == '--time-limit':
+                options['time_limit'] = float(value)
+            elif arg == '--max-states':
+                options['max_states'] = int(value)
+            elif arg == '--max-memory':
+                options['max_memory'] = int(float(value) * (1 << 20))
+            elif arg == '--certificate':
+                options['certificate'] = value
+            else:
+                options['error_rate'] = float(value)
+        elif not arg.startswith('-') and options['board'] is None:
+            options['board'] = arg
+        else:
+            sys.exit(USAGE)
+    if options['board'] is None:
+        sys.exit(USAGE)
+    return options
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    from solve import Solver, UnsolvableError, read_board
+
+    board = read_board(args['board'])
+    try:
+        Solver(board) # a broken board is reported before anything else
+    except ValueError as e:
+        sys.exit('invalid board: %s' % e)
+    try:
+        if args['all']:
+            from optimal import solution_dag
+            try:
+                for solution in solution_dag(board).solutions():
+                    sys.stdout.write(format_solution(solution) + '\n')
+                sys.stdout.flush()
+            except BrokenPipeError: # there can be far too many to read, piping into head is fine
+                import os
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return
+        if args['certificate'] is not None and (args['engine'] == 'bitboard' or args['compact'] or args['approximate']):
+            sys.exit('certificates need the plain search')
+        if args['engine'] == 'bitboard':
+            if args['time_limit'] is not None or args['max_states'] is not None or args['max_memory'] is not None:
+                sys.exit('limits need the scalar engine')
+            from bitboard import BitboardSolver
+            solution = BitboardSolver(board).solve()
+        else:
+            solver = Solver(board, compact=args['compact'])
+            solution = solver.solve(approximate=args['approximate'], error_rate=args['error_rate'],
+                                    time_limit=args['time_limit'], max_states=args['max_states'], max_memory=args['max_memory'])
+            if solution.status != 'solved':
+                stats = solution.stats
+                sys.exit('%s limit reached after %d states, %.1fs, about %.1fMB\nbest: %d of %d destinations filled after %s'
+                         % (solution.status, stats['states'], stats['seconds'], stats['bytes'] / float(1 << 20),
+                            solution.placed, solution.goal, format_solution(solution.best) or 'no moves'))
+            if args['certificate'] is not None:
+                from certificate import certify, write_certificate
+                write_certificate(certify(board, solver, solution), args['certificate'])
+    except UnsolvableError as e:
+        sys.exit('unsolvable' if e.exact else 'no solution found (approximate search)')
+    print(format_solution(solution))
+
+
+if __name__ == '__main__':
+    main()
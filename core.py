@@ -0,0 +1,393 @@
+"""
+    The search core of `Solver`: push chains, moves, state keys and the breadth first loop,
+    on plain typed data. Blocks are the flat array('h') of Status, (row, column, color code,
+    facing code) for every block.
+
+    It is plain Python 3 with complete annotations and nothing dynamic, so mypyc, or Cython
+    in pure Python mode, compiles the module as it is. Built in place, next to this file,
+    `import core` finds the extension before the source:
+
+        mypyc core.py
+        cythonize -i -3 core.py
+
+    Without a build the same code runs interpreted. COMPILED tells which one was loaded;
+    delete the built file to go back. benchmarks/core.py times both on the same boards.
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections import deque
+TYPE_CHECKING = False # true to mypy; importing typing at run time would pull in re, several times the cost of `import solve`
+
+if TYPE_CHECKING: # the annotations are never evaluated
+    from typing import Callable, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+
+    Pos = Tuple[int, int]
+
+COMPILED = not __file__.endswith('.py')
+
+OUT = -1 # step tables: no grid there, the block would leave the board
+BROKEN = -2 # a portal that lets blocks out below or right, or without its pair: the board's step raises
+
+
+def index(blocks: array[int]) -> Tuple[Dict[Pos, int], Dict[Pos, int]]:
+    """
+        pos -> color code and pos -> facing code of blocks. Where blocks merged in a grid,
+        the color that showed up first in blocks wins, and the facing set last.
+    """
+    values = blocks.tolist()
+    grid: Dict[Pos, int] = {}
+    facings: Dict[Pos, int] = {}
+    merged = False
+    for k in range(0, len(values), 4):
+        pos = (values[k], values[k + 1])
+        if pos in grid:
+            merged = True
+        else:
+            grid[pos] = values[k + 2]
+        facings[pos] = values[k + 3]
+    if merged:
+        rank = _ranks(values)
+        for k in range(0, len(values), 4):
+            pos = (values[k], values[k + 1])
+            if rank[values[k + 2]] < rank[grid[pos]]:
+                grid[pos] = values[k + 2]
+    return grid, facings
+
+
+def _ranks(blocks: List[int]) -> Dict[int, int]:
+    # color code -> order it first shows up in
+    rank: Dict[int, int] = {}
+    for k in range(2, len(blocks), 4):
+        if blocks[k] not in rank:
+            rank[blocks[k]] = len(rank)
+    return rank
+
+
+def positions(blocks: array[int], code: int) -> Set[Pos]:
+    return _positions(blocks.tolist(), code)
+
+
+def _positions(blocks: List[int], code: int) -> Set[Pos]:
+    cells: Set[Pos] = set()
+    for k in range(0, len(blocks), 4):
+        if blocks[k + 2] == code:
+            cells.add((blocks[k], blocks[k + 1]))
+    return cells
+
+
+def state_key(blocks: array[int]) -> bytes:
+    """
+        Canonical bytes of a state: the distinct (color, row, column) of its blocks, sorted,
+        each with the facing its grid ends up with. Blocks set in any order, same key.
+    """
+    return _key(blocks.tolist())
+
+
+def _key(blocks: List[int]) -> bytes:
+    # one int a block, color, row and column (a byte each, -1 off the board is 255) and facing
+    values: List[int] = []
+    cells: Set[int] = set()
+    for k in range(0, len(blocks), 4):
+        cell = (blocks[k] & 0xff) << 8 | (blocks[k + 1] & 0xff)
+        cells.add(cell)
+        values.append((blocks[k + 2] << 16 | cell) << 2 | blocks[k + 3])
+    if len(cells) * 4 < len(blocks): # blocks merged: every color once in a grid, with the facing set last there
+        facings: Dict[int, int] = {}
+        for k in range(0, len(blocks), 4):
+            facings[(blocks[k] & 0xff) << 8 | (blocks[k + 1] & 0xff)] = blocks[k + 3]
+        distinct: Set[int] = set()
+        for value in values:
+            distinct.add(value >> 2)
+        values = []
+        for value in distinct:
+            values.append(value << 2 | facings[value & 0xffff])
+    values.sort()
+    return array('q', values).tobytes()
+
+
+def finished(blocks: array[int], goals: Dict[int, FrozenSet[Pos]]) -> bool:
+    """Whether the blocks of every color are on exactly the destinations of that color."""
+    return _finished(blocks.tolist(), goals)
+
+
+def _finished(blocks: List[int], goals: Dict[int, FrozenSet[Pos]]) -> bool:
+    # most states have a block off its destinations, found in the first pass
+    for k in range(0, len(blocks), 4):
+        cells = goals.get(blocks[k + 2])
+        if cells is None or (blocks[k], blocks[k + 1]) not in cells:
+            return False
+    placed: Dict[int, Set[Pos]] = {}
+    for k in range(0, len(blocks), 4):
+        code = blocks[k + 2]
+        if code not in placed:
+            placed[code] = set()
+        placed[code].add((blocks[k], blocks[k + 1]))
+    for code, cells_placed in placed.items():
+        if len(cells_placed) != len(goals[code]):
+            return False
+    return True
+
+
+class Engine:
+    """
+        Moves on one board, with the tables of the board and the push chain switches of its
+        rules. Inside, grids are cells, ints numbering the board with a row and a column of
+        room up and left, where portals by the edge let blocks out; states are indexed as
+        lists of the color and facing in every cell, -1 where there is no block.
+    """
+
+    def __init__(self, rows: int, columns: int, names: List[str], step: Callable[[Pos, int], Optional[Pos]],
+                 turns: Dict[Pos, int], paints: Dict[Pos, int], blocked: Set[Pos], loops_move: bool = True,
+                 chains_turn: bool = True, sorted_movers: bool = True) -> None:
+        self.names = names # of the color codes, the board's list, new colors of later blocks included
+        self.step = step # Board._step, called again to raise where the table says BROKEN
+        self.loops_move = loops_move
+        self.chains_turn = chains_turn
+        self.sorted_movers = sorted_movers
+        self.width = columns + 1
+        self.size = (rows + 1) * self.width
+        self.row: List[int] = []
+        self.column: List[int] = []
+        self.steps: List[int] = [] # cell * 4 + facing code -> cell entered, OUT or BROKEN
+        self.turns: List[int] = [] # cell -> facing code a block entering it takes, or -1
+        self.paints: List[int] = [] # cell -> color code a block entering it takes, or -1
+        self.blocked: List[bool] = []
+        for cell in range(self.size):
+            pos = (cell // self.width - 1, cell % self.width - 1)
+            self.row.append(pos[0])
+            self.column.append(pos[1])
+            self.turns.append(turns.get(pos, -1))
+            self.paints.append(paints.get(pos, -1))
+            self.blocked.append(pos in blocked)
+            for towards in range(4):
+                try:
+                    target = step(pos, towards)
+                except (IndexError, ValueError):
+                    self.steps.append(BROKEN)
+                    continue
+                self.steps.append(OUT if target is None else self.cell(target))
+        self.expanded = 0
+
+    def cell(self, pos: Pos) -> int:
+        return (pos[0] + 1) * self.width + pos[1] + 1
+
+    def _index(self, blocks: List[int]) -> Tuple[List[int], List[int], bool]:
+        # color and facing of every cell, as index() has them, and whether blocks merged
+        grid = [-1] * self.size
+        facings = [-1] * self.size
+        merged = False
+        for k in range(0, len(blocks), 4):
+            cell = (blocks[k] + 1) * self.width + blocks[k + 1] + 1
+            if grid[cell] < 0:
+                grid[cell] = blocks[k + 2]
+            else:
+                merged = True
+            facings[cell] = blocks[k + 3]
+        if merged:
+            rank = _ranks(blocks)
+            for k in range(0, len(blocks), 4):
+                cell = (blocks[k] + 1) * self.width + blocks[k + 1] + 1
+                if rank[blocks[k + 2]] < rank[grid[cell]]:
+                    grid[cell] = blocks[k + 2]
+        return grid, facings, merged
+
+    def _movers(self, blocks: List[int], color: int) -> List[int]:
+        # cells of the blocks of color, in the order they push
+        if not self.sorted_movers: # the order of a set of positions, as before 0.51
+            return [self.cell(pos) for pos in _positions(blocks, color)]
+        cells: List[int] = []
+        for k in range(0, len(blocks), 4):
+            if blocks[k + 2] == color:
+                cell = (blocks[k] + 1) * self.width + blocks[k + 1] + 1
+                if cell not in cells:
+                    cells.append(cell)
+        cells.sort() # cells number grids row by row, sorted cells are sorted positions
+        return cells
+
+    def _unmoved(self, blocks: List[int]) -> List[int]:
+        # Indexes of the blocks in the order they are copied when they don't move. Before 0.51 movers push in the
+        # order of a set of positions, which depends on the order blocks were set in, so the blocks are copied as
+        # the solvers of then did: by a set of the color names, then by a set of the positions of the color.
+        if self.sorted_movers:
+            return list(range(0, len(blocks), 4))
+        codes: List[int] = []
+        for k in range(2, len(blocks), 4):
+            if blocks[k] not in codes:
+                codes.append(blocks[k])
+        names: Set[str] = set()
+        for code in codes:
+            names.add(self.names[code])
+        order: List[int] = []
+        for name in names:
+            code = self.names.index(name)
+            for pos in _positions(blocks, code):
+                for k in range(0, len(blocks), 4):
+                    if blocks[k + 2] == code and (blocks[k], blocks[k + 1]) == pos:
+                        order.append(k)
+                        break
+        return order
+
+    def _chain(self, cell: int, towards: int, grid: List[int], facings: List[int], moved: List[int],
+               in_chain: List[bool]) -> bool:
+        # If there are other blocks on the way of the block we want to push, all of them will be pushed forward one step.
+        # So we first walk forward to find out all the blocks in the chain, then move them all, or none of them.
+        chain: List[int] = [] # cell, color, facing, target of every block from the pusher on
+        can_move = False
+        while True:
+            if in_chain[cell]: # I can move it if it's in a loop. Actually I'm guaranteed to be able to, since 0.51.
+                can_move = self.loops_move
+                break
+            in_chain[cell] = True
+
+            color = grid[cell]
+            target = self.steps[cell * 4 + towards]
+            if target == BROKEN:
+                self.step((self.row[cell], self.column[cell]), towards) # raises
+            chain.append(cell)
+            chain.append(color)
+            chain.append(facings[cell])
+            chain.append(target)
+            if target == OUT:
+                break
+
+            # A color is never among the positions of pushed grids, the check on them in the chains of old
+            # always passed, so blocks already moved still push.
+            preceding = grid[target]
+            if preceding >= 0:
+                # to fix #5, if a block of the same color in the chain wants to move to a different direction, let it.
+                new_towards = facings[target] if preceding == color and self.chains_turn else towards
+                # but of course the new direction can't be opposite of the original direction: N, E, W, S are 0 to 3
+                if towards + new_towards == 3:
+                    break
+                cell = target
+                towards = new_towards
+            elif self.blocked[target]: # there is an obstacle
+                break
+            else: # nothing in the way
+                can_move = True
+                break
+
+        # the forward most block decides for the whole chain, and moves first
+        for k in range(len(chain) - 4, -1, -4):
+            color = chain[k + 1]
+            facing = chain[k + 2]
+            if can_move:
+                target = chain[k + 3]
+                paint = self.paints[target]
+                turn = self.turns[target]
+                moved.extend((self.row[target], self.column[target], color if paint < 0 else paint, facing if turn < 0 else turn))
+            else:
+                cell = chain[k]
+                moved.extend((self.row[cell], self.column[cell], color, facing))
+        return can_move
+
+    def _move(self, blocks: List[int], grid: List[int], facings: List[int], merged: bool, color: int) -> List[int]:
+        moved: List[int] = []
+        in_chain = [False] * self.size
+        for cell in self._movers(blocks, color):
+            if not in_chain[cell]:
+                self._chain(cell, facings[cell], grid, facings, moved, in_chain)
+        # the blocks no chain went through, once for each color in a grid
+        copied: Set[int] = set()
+        for k in self._unmoved(blocks):
+            cell = (blocks[k] + 1) * self.width + blocks[k + 1] + 1
+            if in_chain[cell]:
+                continue
+            if merged:
+                if cell * 256 + blocks[k + 2] in copied:
+                    continue
+                copied.add(cell * 256 + blocks[k + 2])
+            moved.extend((blocks[k], blocks[k + 1], blocks[k + 2], facings[cell]))
+        return moved
+
+    def move(self, blocks: array[int], color: int) -> array[int]:
+        """The blocks after a move of color."""
+        values = blocks.tolist()
+        grid, facings, merged = self._index(values)
+        return array('h', self._move(values, grid, facings, merged, color))
+
+    def push_forward(self, pos: Pos, towards: int, blocks: array[int], moved: array[int], in_chain: Set[Pos]) -> bool:
+        """
+            Push the block at pos towards, with every block on its way: all of them go one
+            step, or none. The blocks of the chain go to moved and their grids to in_chain,
+            where the grids of the chains before are.
+        """
+        grid, facings, merged = self._index(blocks.tolist())
+        chained = [False] * self.size
+        for before in in_chain:
+            chained[self.cell(before)] = True
+        chain: List[int] = []
+        can_move = self._chain(self.cell(pos), towards, grid, facings, chain, chained)
+        moved.extend(chain)
+        for cell in range(self.size):
+            if chained[cell]:
+                in_chain.add((self.row[cell], self.column[cell]))
+        return can_move
+
+    def push_all(self, blocks: array[int], color: int, moved: array[int]) -> Set[Pos]:
+        """Push every block of color, the blocks of the chains to moved. Returns the grids of the chains."""
+        values = blocks.tolist()
+        grid, facings, merged = self._index(values)
+        in_chain = [False] * self.size
+        chains: List[int] = []
+        for cell in self._movers(values, color):
+            if not in_chain[cell]:
+                self._chain(cell, facings[cell], grid, facings, chains, in_chain)
+        moved.extend(chains)
+        chained: Set[Pos] = set()
+        for cell in range(self.size):
+            if in_chain[cell]:
+                chained.add((self.row[cell], self.column[cell]))
+        return chained
+
+    def copy_unmoved(self, blocks: array[int], in_chain: Set[Pos], moved: array[int]) -> None:
+        """The blocks outside the grids of in_chain to moved, once for each color in a grid."""
+        values = blocks.tolist()
+        grid, facings, merged = self._index(values)
+        copied: Set[Tuple[Pos, int]] = set()
+        for k in self._unmoved(values):
+            pos = (values[k], values[k + 1])
+            if pos in in_chain or (pos, values[k + 2]) in copied:
+                continue
+            copied.add((pos, values[k + 2]))
+            moved.extend((values[k], values[k + 1], values[k + 2], facings[self.cell(pos)]))
+
+    def search(self, start: array[int], goals: Dict[int, FrozenSet[Pos]], names: List[str], visited: Dict[bytes, str],
+               check: Optional[Callable[[array[int], str, int, int], Optional[str]]] = None
+               ) -> Tuple[Optional[str], Optional[str]]:
+        """
+            Breadth first search from start, with visited the keys of the states known and
+            the moves to them, start's included. Colors move in the order of their names.
+            check, when given, sees every state before it is expanded, with its moves and
+            how many states are visited and waiting, and returns why to stop, or None.
+            Returns (the moves of a shortest solution, None), (None, why it stopped), or
+            (None, None) when there is no solution.
+        """
+        order = sorted(range(len(names)), key=lambda code: names[code])
+        # states wait as arrays, a fourth of the size of lists, and are lists again when expanded
+        queue: Deque[Tuple[array[int], str]] = deque([(start, visited[state_key(start)])])
+        while queue:
+            state, path = queue.popleft()
+            blocks = state.tolist()
+            if _finished(blocks, goals):
+                return path, None
+            if check is not None:
+                stopped = check(state, path, len(visited), len(queue))
+                if stopped is not None:
+                    return None, stopped
+            self.expanded += 1
+            grid, facings, merged = self._index(blocks)
+            present: Set[int] = set()
+            for k in range(2, len(blocks), 4):
+                present.add(blocks[k])
+            for code in order:
+                if code in present:
+                    child = self._move(blocks, grid, facings, merged, code)
+                    key = _key(child)
+                    if key not in visited:
+                        child_path = path + names[code]
+                        visited[key] = child_path
+                        queue.append((array('h', child), child_path))
+        return None, None
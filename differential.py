@@ -0,0 +1,129 @@
+"""
+    Differential check of the iterative push chain resolver in `Solver._push_forward`
+    against the recursive resolver it replaced.
+
+    Usage: python differential.py board.csv [max_states]
+"""
+
+import sys
+from collections import deque
+
+from solve import Solver, VELOCITIES
+
+
+class RecursiveSolver(Solver):
+    """Solver with the recursive resolver, kept as the reference behaviour."""
+
+    def _push_forward(self, pos, towards, original_status, new_status, pos_in_chain, pushed_grids, original_color):
+        # Solver pushes with facing and color codes, the reference resolver works on their names
+        symbols = self.board.symbols
+        return self._push(pos, symbols.facings.names[towards], original_status, new_status, pos_in_chain, pushed_grids,
+                          symbols.colors.names[original_color])
+
+    def _push(self, pos, towards, original_status, new_status, pos_in_chain, pushed_grids, original_color):
+        if pos in pos_in_chain: # I can move it if it's in a loop. Actually I'm guaranteed to be able to.
+            return True
+        pos_in_chain.add(pos)
+        # If there are other blocks on the way of the block we want to push, all of them will be pushed forward one step.
+        # So we first need to find out all the blocks will be push forward, put them into a stack
+
+        velocity = VELOCITIES[towards]
+        color = original_status.get_color_from_position(pos)
+        facing = original_status.facing(pos)
+
+        target_pos = (pos[0] + velocity[0], pos[1] + velocity[1])
+
+        if 0 <= target_pos[0] < self.board.height() and 0 <= target_pos[1] < self.board.width():
+            if self.board.is_portal(target_pos): # Teleport if meets portal
+                other_portal = self.board.get_another_portal(target_pos)
+                target_pos = (other_portal[0] + velocity[0], other_portal[1] + velocity[1])
+
+            if original_status.get_color_from_position(target_pos) and \
+                original_status.get_color_from_position(target_pos) not in pushed_grids: # there is a preceding block, and not already moved
+                preceding_exist = True
+
+                # to fix #5, if a block of the same color in the chain wants to move to a different direction, let it.
+                if original_status.get_color_from_position(target_pos) == color:
+                    new_towards = original_status.facing(target_pos)
+                else:
+                    new_towards = towards
+                # but of course the new direction can't be opposite of the original direction.
+                if (VELOCITIES[towards][0] + VELOCITIES[new_towards][0], VELOCITIES[towards][1] + VELOCITIES[new_towards][1]) == (0, 0):
+                    preceding_removed = False
+                else:
+                    preceding_removed = self._push(target_pos, new_towards, original_status, new_status, pos_in_chain, pushed_grids, original_color)
+            elif self.board.is_obstacle(target_pos): # there is an obstacle
+                preceding_exist = True
+                preceding_removed = False
+            else: # nothing in the way
+                preceding_exist = False
+
+            if not preceding_exist or preceding_exist and preceding_removed: # removed obstacles, now can move me
+                # see if facing changed
+                new_facing = self.board.get_facing_change_by_position(target_pos) or facing
+                new_color = self.board.get_painted_color_by_position(target_pos) or color
+                new_status.set(new_color, target_pos, new_facing)
+                pushed_grids.add(pos)
+                return True
+            else: # preceding failed, unmove
+                new_status.set(color, pos, facing)
+                return False
+        else: # out of bound, unmove.
+            new_status.set(color, pos, facing)
+            return False
+
+
+def _blocks(status):
+    # every block, merged ones too, with the facing its grid ends up with
+    blocks = status.blocks
+    names = status.symbols.colors.names
+    return sorted(((i, j), names[c], status.facing((i, j))) for i, j, c in zip(blocks[0::4], blocks[1::4], blocks[2::4]))
+
+
+def check_push_resolver(board, max_states=10000):
+    """
+        Explore up to max_states states breadth first and compare the block lists every
+        move produces with both resolvers. Returns (moves checked, mismatches), where the
+        mismatches are (status, color, expected, got) tuples. A portal that lets blocks out
+        below or right of the board raises IndexError: both raising agrees, one raising is a
+        mismatch with the error in place of its status.
+    """
+    solver = Solver(board)
+    reference = RecursiveSolver(board)
+
+    q = deque([solver.init_status])
+    seen = set([solver.init_status])
+    checked = 0
+    mismatches = []
+    while q and len(seen) < max_states:
+        status = q.popleft()
+        for color in sorted(status.colors()):
+            try:
+                expected = reference._move(status, color)
+            except IndexError as e:
+                expected = e
+            try:
+                got = solver._move(status, color)
+            except IndexError as e:
+                got = e
+            checked += 1
+            if isinstance(expected, IndexError) or isinstance(got, IndexError):
+                if not (isinstance(expected, IndexError) and isinstance(got, IndexError)):
+                    mismatches.append((status, color, expected, got))
+                continue
+            if _blocks(got) != _blocks(expected):
+                mismatches.append((status, color, expected, got))
+            if expected not in seen:
+                seen.add(expected)
+                q.append(expected)
+    return checked, mismatches
+
+
+if __name__ == '__main__':
+    from solve import read_board
+
+    max_states = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    checked, mismatches = check_push_resolver(read_board(sys.argv[1]), max_states)
+    sys.stdout.write('%d moves checked, %d mismatches\n' % (checked, len(mismatches)))
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,180 @@
+"""
+    Difficulty profile of a board, to know how expensive it is before committing a long
+    solve to it.
+
+    A bounded breadth first exploration, with the same successor function and visited set
+    as `Solver.solve`, measures per layer the states found, the branching factor, the
+    duplicate ratio and how often moving a color does nothing. Layer growth is then
+    extrapolated to project the total state count, the memory it takes and the solve time
+    against a budget.
+
+    Usage: python difficulty.py board.csv [max_states] [budget_seconds]
+"""
+
+import json
+import sys
+import time
+from math import factorial
+
+from solve import Solver, DIRECTIONS
+from visited import StatePacker
+
+MAX_PROJECTED_LAYERS = 500
+
+
+def _deep_size(status):
+    # the status, its block array and canonical key, as Solver.solve keeps them
+    status.forget()
+    return sys.getsizeof(status) + sys.getsizeof(status.blocks) + sys.getsizeof(status.key or status._key())
+
+
+def state_space_bound(solver):
+    """
+        Upper bound of distinct states: blocks placed on the grids they can be in, several to a
+        grid once they merge, each with a color and a facing.
+    """
+    board = solver.board
+    packer = StatePacker(board, solver.init_status)
+    blocks = len(solver.init_status.blocks) // 4
+    cells = len(set(packer.cells) - set(board.obstacles)) # portal grids and the ones a portal lets blocks out to count too
+    placements = factorial(cells + blocks - 1) // (factorial(blocks) * factorial(cells - 1))
+    return placements * (len(packer.colors) * len(DIRECTIONS)) ** blocks
+
+
+def explore(board, max_states=50000, max_seconds=None):
+    solver = Solver(board)
+    status = solver.init_status
+    start = time.time()
+
+    layers = []
+    noops = dict((c, 0) for c in status.colors())
+    moves = dict((c, 0) for c in status.colors())
+    frontier = [status]
+    visited = set([status])
+    solution_length = None
+    complete = False
+    sizes = []
+    while True:
+        if any(s.finished(solver.board) for s in frontier):
+            solution_length = len(layers)
+            break
+        if len(visited) >= max_states or max_seconds is not None and time.time() - start > max_seconds:
+            break
+        generated = duplicates = 0
+        next_frontier = []
+        for status in frontier:
+            for color in sorted(status.colors()):
+                new_status = solver._move(status, color)
+                generated += 1
+                moves[color] = moves.get(color, 0) + 1
+                if new_status == status:
+                    noops[color] = noops.get(color, 0) + 1
+                if new_status in visited:
+                    duplicates += 1
+                else:
+                    visited.add(new_status)
+                    next_frontier.append(new_status)
+                    if len(sizes) < 200:
+                        sizes.append(_deep_size(new_status))
+        layers.append({
+            'depth': len(layers),
+            'states': len(frontier),
+            'generated': generated,
+            'new': len(next_frontier),
+            'duplicates': duplicates,
+            'branching': float(len(next_frontier)) / len(frontier),
+        })
+        frontier = next_frontier
+        if not frontier:
+            complete = True
+            break
+
+    elapsed = time.time() - start
+    expanded = sum(layer['states'] for layer in layers)
+    generated = sum(layer['generated'] for layer in layers)
+    # the set slot and the path string Solver.solve keeps next to every state
+    overhead = float(sys.getsizeof(visited)) / len(visited) + sys.getsizeof('x' * len(layers))
+    per_state = (float(sum(sizes)) / len(sizes) if sizes else _deep_size(solver.init_status)) + overhead
+
+    return solver, {
+        'size': [solver.board.height(), solver.board.width()],
+        'explored': {
+            'layers': len(layers),
+            'states': len(visited),
+            'expanded': expanded,
+            'seconds': elapsed,
+            'complete': complete,
+            'solution_length': solution_length,
+        },
+        'layers': layers,
+        'noop_fraction': dict((c, float(noops[c]) / moves[c]) for c in sorted(moves) if moves[c]),
+        'duplicate_ratio': float(sum(layer['duplicates'] for layer in layers)) / generated if generated else 0.0,
+        'bytes_per_state': per_state,
+        'seconds_per_state': elapsed / expanded if expanded else 0.0,
+    }
+
+
+def project(solver, profile, budget_seconds=60.0):
+    """
+        Extrapolate the layer sizes: the growth ratio of the last layers keeps shrinking by
+        the factor it shrank by lately, until layers die out or the state space is used up.
+    """
+    explored = profile['explored']
+    bound = state_space_bound(solver)
+    if explored['complete'] or explored['solution_length'] is not None or not profile['layers']:
+        # with no layer expanded, before the first one was over budget, there is nothing to extrapolate
+        states = explored['states']
+        basis = 'explored'
+    else:
+        sizes = [layer['states'] for layer in profile['layers']] + [profile['layers'][-1]['new']]
+        ratios = [float(b) / a for a, b in zip(sizes, sizes[1:]) if a]
+        recent = ratios[-3:]
+        growth = 1.0
+        for r in recent:
+            growth *= r
+        growth **= 1.0 / len(recent)
+        decay = 1.0
+        if len(recent) > 1 and recent[0] > 0:
+            decay = min(1.0, (recent[-1] / recent[0]) ** (1.0 / (len(recent) - 1)))
+
+        states = float(explored['states'])
+        layer = float(sizes[-1])
+        basis = 'extrapolated'
+        for i in range(MAX_PROJECTED_LAYERS):
+            growth *= decay
+            layer *= growth
+            if layer < 1:
+                break
+            states += layer
+            if states >= bound:
+                states = bound
+                basis = 'state space bound'
+                break
+        states = int(states)
+
+    seconds = states * profile['seconds_per_state']
+    return {
+        'basis': basis,
+        'states': states,
+        'state_space_bound': bound,
+        'memory_bytes': int(states * profile['bytes_per_state']),
+        'seconds': seconds,
+        'budget_seconds': budget_seconds,
+        'within_budget': seconds <= budget_seconds,
+    }
+
+
+def profile_board(board, max_states=50000, budget_seconds=60.0, max_seconds=None):
+    solver, profile = explore(board, max_states, max_seconds)
+    profile['projection'] = project(solver, profile, budget_seconds)
+    return profile
+
+
+if __name__ == '__main__':
+    from solve import read_board
+
+    max_states = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    budget = float(sys.argv[3]) if len(sys.argv) > 3 else 60.0
+    profile = profile_board(read_board(sys.argv[1]), max_states, budget)
+    profile['board'] = sys.argv[1]
+    print(json.dumps(profile, indent=2, sort_keys=True))
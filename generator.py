@@ -0,0 +1,212 @@
+"""
+    Level generator: random boards, solved and kept when their shortest solution has the
+    wanted length.
+
+    Candidates place blocks, as many destinations of each color, portal pairs, changers,
+    painters and obstacles on random grids. Each one goes through cheap filters before any
+    search:
+
+    - a canonical fingerprint, colors and portal names renamed in reading order, drops the
+      levels seen already, in this run or in the corpus from earlier runs
+    - loading it into `Solver.Board` and `Solver.Status` drops broken boards, and
+      `Solver.precheck` the provably unsolvable ones
+    - the search itself is capped at max_states kept states, levels too big to solve
+      quickly are dropped rather than waited for
+
+    Searches run in a process pool. Accepted levels go to directory/boards/ as board files,
+    with their solutions appended to directory/corpus.txt, in the format replay.py checks,
+    and their difficulty to directory/metadata.jsonl, one JSON object per level.
+
+    Usage: python generator.py directory count [--size N] [--colors N] [--blocks N]
+           [--portals N] [--changers N] [--painters N] [--obstacles N] [--min-moves N]
+           [--max-moves N] [--max-states N] [--processes N] [--seed N]
+"""
+
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+from solve import (Solver, UnsolvableError, write_board, DIRECTIONS, DESTINATION_PREFIX, PAINTER_PREFIX,
+                   PORTAL_PREFIX, CHANGER_PREFIX, OBSTACLE)
+
+COLOR_NAMES = 'RGBYWK'
+PARAMETERS = {'size': 5, 'colors': 2, 'blocks': 1, 'portals': 1, 'changers': 1, 'painters': 0, 'obstacles': 2}
+
+
+def random_board(rnd, size=5, colors=2, blocks=1, portals=1, changers=1, painters=0, obstacles=2):
+    """A size x size board with blocks blocks and as many destinations of each of colors colors."""
+    names = COLOR_NAMES[:colors]
+    things = []
+    for c in names:
+        things += [rnd.choice(DIRECTIONS) + c for k in range(blocks)]
+        things += [DESTINATION_PREFIX + c] * blocks
+    for k in range(portals):
+        things += [PORTAL_PREFIX + str(k + 1)] * 2
+    things += [CHANGER_PREFIX + rnd.choice(DIRECTIONS) for k in range(changers)]
+    things += [PAINTER_PREFIX + rnd.choice(names) for k in range(painters)]
+    things += [OBSTACLE] * obstacles
+    if len(things) > size * size:
+        raise ValueError('%d grids do not fit on a %dx%d board' % (len(things), size, size))
+    cells = rnd.sample(range(size * size), len(things))
+    board = [['' for j in range(size)] for i in range(size)]
+    for cell, thing in zip(cells, things):
+        board[cell // size][cell % size] = thing
+    return board
+
+
+def canonical(board):
+    # colors and portal names renamed in the order they are read, the level stays the same
+    colors = {}
+    portals = {}
+    rows = []
+    for row in board:
+        cells = []
+        for grid in row:
+            if grid != '' and (grid[0] in DIRECTIONS or grid[0] in (DESTINATION_PREFIX, PAINTER_PREFIX)):
+                grid = grid[0] + str(colors.setdefault(grid[1:], len(colors)))
+            elif grid != '' and grid[0] == PORTAL_PREFIX:
+                grid = grid[0] + str(portals.setdefault(grid[1:], len(portals)))
+            cells.append(grid)
+        rows.append(cells)
+    return rows
+
+
+def fingerprint(board):
+    text = '\n'.join(','.join(row) for row in canonical(board))
+    return hashlib.blake2b(text.encode('ascii'), digest_size=12).hexdigest()
+
+
+def _solve_candidate(item):
+    # in a worker: (fingerprint, board, outcome, metadata), outcome one of invalid, pruned, capped, unsolvable, solved
+    key, board, max_states = item
+    start = time.time()
+    try:
+        solver = Solver(board)
+    except ValueError:
+        return key, board, 'invalid', None
+    try:
+        solution = solver.solve(max_states=max_states)
+    except UnsolvableError: # solve runs the precheck first, a board it rules out has nothing expanded
+        return key, board, 'unsolvable' if solver.stats['expanded'] else 'pruned', None
+    except IndexError: # a portal that lets blocks out of the board
+        return key, board, 'invalid', None
+    if solution.status != 'solved':
+        return key, board, 'capped', None
+
+    kinds = dict((prefix, sum(1 for row in board for grid in row if grid[:1] == prefix))
+                 for prefix in (PORTAL_PREFIX, CHANGER_PREFIX, PAINTER_PREFIX, OBSTACLE))
+    moves = len(solution)
+    return key, board, 'solved', {
+        'fingerprint': key,
+        'solution': str(solution),
+        'moves': moves,
+        'expanded': solver.stats['expanded'],
+        'states': len(solver.visited),
+        'branching': len(solver.visited) ** (1.0 / moves) if moves else 0.0, # effective branching factor
+        'seconds': time.time() - start,
+        'size': len(board),
+        'colors': len(solver.init_status.colors()),
+        'blocks': len(solver.init_status.blocks) // 4,
+        'portals': kinds[PORTAL_PREFIX] // 2,
+        'changers': kinds[CHANGER_PREFIX],
+        'painters': kinds[PAINTER_PREFIX],
+        'obstacles': kinds[OBSTACLE],
+    }
+
+
+def read_fingerprints(directory):
+    """Fingerprints of the levels already in the corpus of directory."""
+    filename = os.path.join(directory, 'metadata.jsonl')
+    if not os.path.exists(filename):
+        return set()
+    with open(filename, 'r') as f:
+        return set(json.loads(line)['fingerprint'] for line in f if line.strip())
+
+
+def generate(directory, count, processes=None, seed=0, min_moves=1, max_moves=None, max_states=20000,
+             max_candidates=None, chunksize=16, callback=None, **parameters):
+    """
+        Add count levels of min_moves to max_moves moves to the corpus of directory, trying
+        at most max_candidates candidates. callback gets the metadata of every level kept.
+        Returns the number of candidates that ended each way, and how many were duplicates.
+    """
+    from multiprocessing import Pool, cpu_count
+    from threading import Event, Semaphore
+
+    parameters = dict(PARAMETERS, **parameters)
+    boards = os.path.join(directory, 'boards')
+    if not os.path.isdir(boards):
+        os.makedirs(boards)
+    seen = read_fingerprints(directory)
+    stats = dict((outcome, 0) for outcome in ('candidates', 'duplicates', 'invalid', 'pruned', 'capped', 'unsolvable', 'out of range', 'kept'))
+
+    # The pool pulls candidates from its own thread, as fast as they come; the semaphore keeps it a few chunks
+    # per process ahead of the results, and the pool only stops once that thread is woken up and let go.
+    window = Semaphore(chunksize * (processes or cpu_count()) * 4)
+    stopping = Event()
+
+    def candidates():
+        rnd = random.Random(seed)
+        while max_candidates is None or stats['candidates'] < max_candidates:
+            board = random_board(rnd, **parameters)
+            stats['candidates'] += 1
+            key = fingerprint(board)
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            window.acquire()
+            if stopping.is_set():
+                return
+            yield key, board, max_states
+
+    pool = Pool(processes)
+    try:
+        with open(os.path.join(directory, 'corpus.txt'), 'a') as corpus, open(os.path.join(directory, 'metadata.jsonl'), 'a') as metadata:
+            for key, board, outcome, level in pool.imap_unordered(_solve_candidate, candidates(), chunksize):
+                window.release()
+                if outcome == 'solved' and (level['moves'] < min_moves or max_moves is not None and level['moves'] > max_moves):
+                    outcome = 'out of range'
+                if outcome != 'solved':
+                    stats[outcome] += 1
+                    continue
+                filename = os.path.join(boards, key + '.csv')
+                write_board(board, filename)
+                level['board'] = filename
+                corpus.write('%s\t%s\n' % (filename, level['solution']))
+                metadata.write(json.dumps(level, sort_keys=True) + '\n')
+                stats['kept'] += 1
+                if callback is not None:
+                    callback(level)
+                if stats['kept'] >= count:
+                    break
+    finally:
+        stopping.set()
+        window.release()
+        pool.terminate()
+    return stats
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {}
+    for name in list(PARAMETERS) + ['min-moves', 'max-moves', 'max-states', 'processes', 'seed']:
+        if '--' + name in args:
+            options[name.replace('-', '_')] = int(args.pop(args.index('--' + name) + 1))
+            args.remove('--' + name)
+    if len(args) != 2:
+        sys.exit(__doc__)
+
+    start = time.time()
+
+    def report(level):
+        sys.stdout.write('%s %2d moves %7d states %.3fs\n' % (level['board'], level['moves'], level['states'], level['seconds']))
+        sys.stdout.flush()
+
+    stats = generate(args[0], int(args[1]), callback=report, **options)
+    elapsed = time.time() - start
+    sys.stdout.write('%d candidates in %.1fs, %.0f a minute: %s\n' % (stats['candidates'], elapsed, stats['candidates'] * 60 / elapsed,
+                                                                 ', '.join('%d %s' % (stats[k], k) for k in sorted(stats) if k != 'candidates')))
@@ -0,0 +1,153 @@
+"""
+    Macro moves: the runs of moves of a color that can never meet another block, searched
+    as one successor that costs as many moves as it holds.
+
+    Per board, every color gets a bound on where the blocks of all other colors could
+    ever go: flooding from their grids in every direction they face or could be turned to,
+    through portals, around obstacles. When the blocks of a color, moved alone, keep out of
+    that region all the way to their destinations, nothing else ever pushes them, blocks
+    them, or gets pushed by them. Where they are then only depends on how many times the
+    color moved, and the one count that matters is the first that puts them on their
+    destinations: fewer leaves the level unfinished, more only walks them away and back
+    again. Moved alone, a color ends up going around in a loop; the whole loop is checked,
+    not only the way to the destinations. The color then has a single successor, the whole
+    run, and none once it is done.
+
+    The runs go through `AnytimeSolver.best_first` at weight 1, where a successor of k moves
+    costs k: Dijkstra with no heuristic, A* with an admissible one such as the pattern
+    database of patterns.py. Both keep the solution a shortest one, though among shortest
+    ones not always the one `Solver.solve` picks.
+
+    Usage: python macros.py board.csv [pattern_directory]
+"""
+
+import sys
+from array import array
+
+from anytime import AnytimeSolver
+from solve import Solver, UnsolvableError, Solution
+
+
+def _reach(board, starts, facings):
+    # grids blocks at starts could ever be in, moving any way they face or are turned to on the way
+    directions = set(facings)
+    while True:
+        cells = set(starts)
+        stack = list(starts)
+        while stack:
+            pos = stack.pop()
+            for towards in directions:
+                target_pos = board._step(pos, towards)
+                if target_pos is not None and target_pos not in board.blocked and target_pos not in cells:
+                    cells.add(target_pos)
+                    stack.append(target_pos)
+        turned = set(board.turns[pos] for pos in cells if pos in board.turns)
+        if turned <= directions:
+            return cells
+        directions |= turned
+
+
+def find_runs(solver):
+    """
+        color code -> (moves, blocks of that color in Status order after them) of the run that
+        takes the color to its destinations, for the colors that can never meet another block.
+        A color already there has a run of no moves, it is never moved. Raises
+        UnsolvableError when such a color can't be finished at all.
+    """
+    if not solver.rules.sorted_movers:
+        raise ValueError('moves depend on set order under version %s, runs cannot be cut out' % solver.rules.name)
+    board = solver.board
+    blocks = solver.init_status.blocks
+    runs = {}
+    for code in dict.fromkeys(blocks[2::4]):
+        mine = array('h')
+        starts = []
+        facings = []
+        for k in range(0, len(blocks), 4):
+            if blocks[k + 2] == code:
+                mine.extend(blocks[k:k + 4])
+            else:
+                starts.append((blocks[k], blocks[k + 1]))
+                facings.append(blocks[k + 3])
+        try:
+            others = _reach(board, starts, facings)
+        except (IndexError, ValueError): # portals that let blocks out, moving them raises anyway
+            continue
+        if any(board.paints[pos] == code for pos in others if pos in board.paints):
+            continue # another color can be painted into this one
+
+        # every place the color can be moved to has to stay clear, not only the way to its destinations
+        goal = board.goals.get(code, frozenset())
+        seen = set()
+        run = mine
+        first = None # moves to the destinations, and the blocks there
+        while run.tobytes() not in seen:
+            cells = set(zip(run[0::4], run[1::4]))
+            if cells & others or any(board.paints.get(pos, code) != code for pos in cells):
+                break
+            if cells == goal and first is None:
+                first = (len(seen), run)
+            seen.add(run.tobytes())
+            try:
+                run = solver.engine.move(run, code)
+            except (IndexError, ValueError):
+                break
+        else: # around and around, clear of everything
+            if first is None:
+                raise UnsolvableError()
+            runs[code] = first
+    return runs
+
+
+class MacroSolver(AnytimeSolver):
+    """Best first search where every color of find_runs moves in one go."""
+
+    def __init__(self, board, heuristic=None):
+        AnytimeSolver.__init__(self, board, weights=(1.0,), heuristic=heuristic or (lambda board, status: 0))
+        self.runs = find_runs(self.solver)
+        names = self.solver.board.symbols.colors.names
+        self.stats['runs'] = dict((names[code], moves) for code, (moves, run) in self.runs.items()) # color -> moves of its run
+
+    def _successors(self, status):
+        board = self.solver.board
+        for color in sorted(status.colors()):
+            code = board.symbols.colors.codes[color]
+            if code not in self.runs:
+                new_status = self.solver._move(status, color)
+            elif status._positions(code) == board.goals[code]: # the run is behind, the color never moves again
+                continue
+            else:
+                moves, run = self.runs[code]
+                blocks = status.blocks
+                rest = array('h')
+                for k in range(0, len(blocks), 4):
+                    if blocks[k + 2] != code:
+                        rest.extend(blocks[k:k + 4])
+                new_status = self.solver._status(rest + run)
+                color = color * moves
+            yield color, new_status, self.packer.pack(new_status)
+
+
+def solve_macros(board, heuristic=None):
+    """The shortest solution, searched with macro moves, and the states expanded."""
+    solver = MacroSolver(board, heuristic)
+    found = solver.best_first(1.0)
+    if found is None:
+        raise UnsolvableError()
+    return Solution(found), solver.stats
+
+
+if __name__ == '__main__':
+    import time
+    from cli import format_solution
+    from solve import read_board
+
+    board = read_board(sys.argv[1])
+    heuristic = None
+    if len(sys.argv) > 2:
+        from patterns import PatternDatabase
+        heuristic = PatternDatabase.open(Solver(board).board, sys.argv[2]).heuristic
+    start = time.time()
+    solution, stats = solve_macros(board, heuristic)
+    sys.stdout.write('%s\n%d states expanded in %.2fs, runs %s\n' % (format_solution(solution), stats['expanded'], time.time() - start,
+                                                                     ' '.join('%s x%d' % run for run in sorted(stats['runs'].items())) or 'none'))
@@ -0,0 +1,119 @@
+"""
+    Every shortest solution of a board, not just the first one.
+
+    Breadth first search goes layer by layer with packed visited states, like the compact
+    solver, but keeps every (parent, color) that reaches a state of the next layer, not
+    only the first one. States get dense indices in layer order, so the edges into each
+    state are one slice of flat arrays: a layered DAG with a few bytes per edge and no
+    path strings.
+
+    Solutions are streamed from the DAG by a depth first walk back from the goals, which
+    only holds the current path; their number can be far too large to list, `count` gives
+    it without enumerating them.
+"""
+
+from array import array
+
+from solve import Solver, UnsolvableError, Solution
+from visited import PackedStateSet, StatePacker
+
+
+class SolutionDAG:
+    """
+        Shortest-path parents of the states up to the goal layer. The edges into state k are
+        parents[starts[k]:starts[k + 1]] with the colors moved in moves[...].
+    """
+
+    def __init__(self, colors, depth, goals, starts, parents, moves):
+        self.colors = colors
+        self.depth = depth
+        self.goals = goals
+        self.starts = starts
+        self.parents = parents
+        self.moves = moves
+
+    def states(self):
+        return len(self.starts) - 1
+
+    def count(self):
+        """Number of shortest solutions, counting paths through the DAG in index order."""
+        paths = [1] + [0] * (self.states() - 1)
+        for state in range(1, self.states()):
+            paths[state] = sum(paths[self.parents[e]] for e in range(self.starts[state], self.starts[state + 1]))
+        return sum(paths[goal] for goal in self.goals)
+
+    def solutions(self):
+        """Yield every shortest solution, lazily."""
+        for goal in self.goals:
+            # one (state, next edge) per move on the way back from the goal
+            stack = [(goal, self.starts[goal])]
+            path = []
+            while stack:
+                state, edge = stack[-1]
+                if state == 0:
+                    yield Solution(''.join(reversed(path)))
+                    stack.pop()
+                    if path:
+                        path.pop()
+                elif edge == self.starts[state + 1]:
+                    stack.pop()
+                    if path:
+                        path.pop()
+                else:
+                    stack[-1] = (state, edge + 1)
+                    path.append(self.colors[self.moves[edge]])
+                    stack.append((self.parents[edge], self.starts[self.parents[edge]]))
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.starts, self.parents)) + len(self.moves)
+
+
+def solution_dag(board, mmap_dir=None):
+    """Breadth first search keeping all shortest-path parents, up to the first layer with a goal."""
+    solver = Solver(board)
+    packer = StatePacker(solver.board, solver.init_status)
+    visited = PackedStateSet(packer.width, mmap_dir=mmap_dir)
+    visited.add(packer.pack(solver.init_status))
+
+    starts = array('i', [0, 0])
+    parents = array('i')
+    moves = bytearray()
+    frontier = [(solver.init_status, 0)]
+    depth = 0
+    goals = []
+    if solver.init_status.finished(solver.board):
+        goals.append(0)
+    while frontier and not goals:
+        first = len(visited) # states of the next layer get the indices from here on
+        edges = []
+        next_frontier = []
+        for status, index in frontier:
+            for color in sorted(status.colors()):
+                new_status = solver._move(status, color)
+                key = packer.pack(new_status)
+                if visited.add(key):
+                    child = len(visited) - 1
+                    next_frontier.append((new_status, child))
+                    if new_status.finished(solver.board):
+                        goals.append(child)
+                else:
+                    child = visited.index(key)
+                    if child < first: # reached earlier, not on a shortest path through this move
+                        continue
+                edges.append((child, index, packer.color_index[color]))
+
+        # edges come grouped by parent, regroup them by child
+        edges.sort()
+        counts = [0] * (len(visited) - first)
+        for child, index, color_index in edges:
+            parents.append(index)
+            moves.append(color_index)
+            counts[child - first] += 1
+        for n in counts:
+            starts.append(starts[-1] + n)
+        frontier = next_frontier
+        depth += 1
+
+    if not goals:
+        raise UnsolvableError()
+    return SolutionDAG(packer.colors, depth, goals, starts, parents, moves)
@@ -0,0 +1,308 @@
+"""
+    Parallel solver for wide, shallow levels.
+
+    The parent runs breadth first search for the first few layers. Every state of the last
+    layer roots a subtree, and worker processes pull subtrees off the pool's shared task
+    queue, so a worker that finishes a small subtree just takes the next one. Each subtree
+    gets a depth-bounded depth first search, with the bound raised one move at a time until
+    a solution shows up.
+
+    Workers share one visited table in `multiprocessing.shared_memory`. It maps a state
+    fingerprint to the best (depth, root) that reached it. A state is only pruned when
+    a path that is no worse in both reached it first: fewer moves, or as many moves from
+    a root that comes earlier. Colors are tried in sorted `Board.colors()` order, so the
+    answer is always the lexicographically smallest shortest solution, the same one
+    `Solver.solve` returns, no matter how the subtrees were scheduled.
+
+    `solve_layered` is the plain layer-synchronous alternative for levels where breadth
+    first search fits in memory. Both exchange states between processes through a shared
+    `StateArena`, as indices.
+
+    Usage: python parallel.py board.csv [processes] [root_depth | layered]
+"""
+
+import hashlib
+import struct
+import sys
+from array import array
+from multiprocessing import Lock, Pool, shared_memory
+
+from arena import StateArena, attach
+from solve import Solver, UnsolvableError, Solution
+from visited import PackedStateSet, StatePacker
+
+_SLOT = struct.Struct('<QiI') # fingerprint (0 = empty), depth, root index
+_COUNT = struct.Struct('<H') # values in the blocks of an arena record
+_STRIPES = 64
+
+
+def fingerprint(key):
+    # 64 bits, stable across processes unlike hash(); a collision could prune a state wrongly, at odds of about n^2 / 2^65
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+class SharedVisitedTable:
+    """
+        Open-addressing table in shared memory, locked by stripes of slots. When it is full
+        claims always succeed, which only costs pruning, never correctness.
+    """
+
+    def __init__(self, slots, name=None, locks=None):
+        self.slots = slots
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * _SLOT.size)
+            self.owner = True
+        else:
+            self.shm = attach(name)
+            self.owner = False
+        self.buf = self.shm.buf
+        self.locks = locks or [Lock() for i in range(_STRIPES)]
+
+    def clear(self):
+        self.buf[:] = bytes(len(self.buf))
+
+    def claim(self, fp, depth, root):
+        """Record (depth, root) for fp if it beats what is there; False means prune."""
+        slot = fp % self.slots
+        for probe in range(self.slots):
+            offset = slot * _SLOT.size
+            with self.locks[slot % _STRIPES]:
+                old_fp, old_depth, old_root = _SLOT.unpack_from(self.buf, offset)
+                if old_fp == 0 or old_fp == fp and (depth, root) < (old_depth, old_root):
+                    _SLOT.pack_into(self.buf, offset, fp, depth, root)
+                    return True
+                if old_fp == fp:
+                    return False
+            slot = (slot + 1) % self.slots
+        return True
+
+    def close(self):
+        self.buf.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# per worker process state, set up by _init_worker
+_solver = None
+_packer = None
+_table = None
+_arena = None
+
+
+def _record_width(solver, packer):
+    # blocks never outnumber the ones the level starts with, merging only drops some
+    return packer.width + _COUNT.size + solver.init_status.blocks.itemsize * len(solver.init_status.blocks)
+
+
+def _record(key, status, width):
+    # An arena record: the packed key, then the blocks themselves. Which color shows in a merged grid depends on
+    # the order blocks were set in, which the key leaves out, so states travel as they are.
+    blocks = status.blocks
+    record = key + _COUNT.pack(len(blocks)) + blocks.tobytes()
+    return record + bytes(width - len(record))
+
+
+def _init_worker(board, table_name, table_slots, locks, arena_name, arena_capacity, arena_lock):
+    global _solver, _packer, _table, _arena
+    _solver = Solver(board)
+    _packer = StatePacker(_solver.board, _solver.init_status)
+    _table = SharedVisitedTable(table_slots, table_name, locks)
+    _arena = StateArena(_record_width(_solver, _packer), arena_capacity, arena_name, arena_lock)
+
+
+def _load(index):
+    record = bytes(_arena.view(index))
+    count = _COUNT.unpack_from(record, _packer.width)[0]
+    start = _packer.width + _COUNT.size
+    blocks = array('h')
+    blocks.frombytes(record[start:start + count * blocks.itemsize])
+    return _solver._status(blocks)
+
+
+def _search_root(task):
+    """Depth first search below one root. Returns (root, solution suffix or None, whether the bound was reached)."""
+    root, index, depth, bound = task
+    reached = [False]
+
+    def dfs(status, depth, path):
+        for color in sorted(status.colors()):
+            new_status = _solver._move(status, color)
+            key = _packer.pack(new_status)
+            if not _table.claim(fingerprint(key), depth + 1, root):
+                continue
+            if depth + 1 == bound:
+                reached[0] = True
+                if new_status.finished(_solver.board):
+                    return path + color
+            else:
+                found = dfs(new_status, depth + 1, path + color)
+                if found is not None:
+                    return found
+        return None
+
+    return root, dfs(_load(index), depth, ""), reached[0]
+
+
+def solve_parallel(board, processes=None, root_depth=4, table_slots=1 << 20, max_depth=None):
+    solver = Solver(board)
+    packer = StatePacker(solver.board, solver.init_status)
+
+    # layer by layer breadth first search for the roots, keeping paths in sorted color order
+    init_key = packer.pack(solver.init_status)
+    layers = [[(solver.init_status, "", init_key)]]
+    seen = set([init_key])
+    while len(layers) <= root_depth:
+        for status, path, key in layers[-1]:
+            if status.finished(solver.board):
+                return Solution(path)
+        layer = []
+        for status, path, key in layers[-1]:
+            for color in sorted(status.colors()):
+                new_status = solver._move(status, color)
+                key = packer.pack(new_status)
+                if key not in seen:
+                    seen.add(key)
+                    layer.append((new_status, path + color, key))
+        if not layer:
+            raise UnsolvableError()
+        layers.append(layer)
+    roots = layers[-1]
+    for status, path, key in roots:
+        if status.finished(solver.board):
+            return Solution(path)
+
+    table = SharedVisitedTable(table_slots)
+    # roots travel as arena indices, workers load them instead of receiving pickled statuses
+    arena = StateArena(_record_width(solver, packer), len(roots))
+    root_indices = [arena.append(_record(key, status, arena.width)) for status, path, key in roots]
+    pool = Pool(processes, _init_worker, (board, table.shm.name, table_slots, table.locks, arena.name, arena.capacity, arena.lock))
+    try:
+        bound = root_depth
+        while max_depth is None or bound < max_depth:
+            bound += 1
+            table.clear()
+            # states of the first layers are best reached the breadth first way
+            for depth, layer in enumerate(layers):
+                for status, path, key in layer:
+                    table.claim(fingerprint(key), depth, 0)
+
+            found = {}
+            reached = False
+            tasks = [(root, root_indices[root], root_depth, bound) for root in range(len(roots))]
+            for root, suffix, root_reached in pool.imap_unordered(_search_root, tasks):
+                reached = reached or root_reached
+                if suffix is not None:
+                    found[root] = suffix
+            if found:
+                root = min(found)
+                return Solution(roots[root][1] + found[root])
+            if not reached: # every branch ended before the bound, nothing left to explore
+                raise UnsolvableError()
+        raise UnsolvableError()
+    finally:
+        pool.terminate()
+        pool.join()
+        table.close()
+        arena.close()
+
+
+def _expand(task):
+    """
+        Expand a slice of the frontier. Children go to the arena, and only their indices come
+        back: (child, parent rank, color index, finished) per child, flattened in an array.
+    """
+    depth, first_rank, indices = task
+    colors = len(_packer.colors)
+    children = []
+    for rank, index in enumerate(indices, first_rank):
+        status = _load(index)
+        for color in sorted(status.colors()):
+            new_status = _solver._move(status, color)
+            key = _packer.pack(new_status)
+            color_index = _packer.color_index[color]
+            # the earliest (parent, color) wins a state, a later one is not worth writing
+            if _table.claim(fingerprint(key), depth + 1, rank * colors + color_index):
+                children.append((_record(key, new_status, _arena.width), rank, color_index, new_status.finished(_solver.board)))
+
+    result = array('i')
+    if children:
+        first = _arena.reserve(len(children))
+        for offset, (record, rank, color_index, finished) in enumerate(children):
+            _arena.write(first + offset, record)
+            result.extend((first + offset, rank, color_index, finished))
+    return result.tobytes()
+
+
+def solve_layered(board, processes=None, chunk=256, arena_capacity=1 << 22, table_slots=1 << 22):
+    """
+        Layer-synchronous breadth first search. Workers expand slices of the frontier into
+        the shared arena, and the parent keeps the canonical parent pointers, one per arena
+        index, to rebuild the path. Children are accepted in (parent, color) order, so the
+        result is the same lexicographically smallest shortest solution as Solver.solve.
+    """
+    solver = Solver(board)
+    if solver.init_status.finished(solver.board):
+        return Solution("")
+    packer = StatePacker(solver.board, solver.init_status)
+
+    table = SharedVisitedTable(table_slots, locks=[Lock() for i in range(_STRIPES)])
+    arena = StateArena(_record_width(solver, packer), arena_capacity)
+    init_key = packer.pack(solver.init_status)
+    frontier = [arena.append(_record(init_key, solver.init_status, arena.width))]
+    table.claim(fingerprint(init_key), 0, 0)
+    visited = PackedStateSet(packer.width)
+    visited.add(init_key)
+    parents = array('i', [-1])
+    moves = bytearray(1)
+
+    pool = Pool(processes, _init_worker, (board, table.shm.name, table_slots, table.locks, arena.name, arena.capacity, arena.lock))
+    try:
+        depth = 0
+        while frontier:
+            tasks = [(depth, first, frontier[first:first + chunk]) for first in range(0, len(frontier), chunk)]
+            children = []
+            for result in pool.imap_unordered(_expand, tasks):
+                flat = array('i')
+                flat.frombytes(result)
+                children.extend(tuple(flat[i:i + 4]) for i in range(0, len(flat), 4))
+
+            parents.extend([-1] * (len(arena) - len(parents)))
+            moves.extend(bytes(len(arena) - len(moves)))
+            children.sort(key=lambda child: (child[1], child[2]))
+            next_frontier = []
+            goal = None
+            for child, rank, color_index, finished in children:
+                if visited.add(bytes(arena.view(child)[:packer.width])): # slots of duplicates stay unused
+                    parents[child] = frontier[rank]
+                    moves[child] = color_index
+                    next_frontier.append(child)
+                    if finished and goal is None:
+                        goal = child
+            if goal is not None:
+                path = []
+                while parents[goal] >= 0:
+                    path.append(packer.colors[moves[goal]])
+                    goal = parents[goal]
+                return Solution(''.join(reversed(path)))
+            frontier = next_frontier
+            depth += 1
+        raise UnsolvableError()
+    finally:
+        pool.terminate()
+        pool.join()
+        table.close()
+        arena.close()
+
+
+if __name__ == '__main__':
+    from cli import format_solution
+    from solve import read_board
+
+    board = read_board(sys.argv[1])
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if len(sys.argv) > 3 and sys.argv[3] == 'layered':
+        solution = solve_layered(board, processes)
+    else:
+        solution = solve_parallel(board, processes, int(sys.argv[3]) if len(sys.argv) > 3 else 4)
+    print(format_solution(solution))
@@ -0,0 +1,226 @@
+"""
+    Pattern databases: an admissible heuristic from per-color relaxations of the board.
+
+    In one move every block goes at most one step, pushed its own way or any other way, and
+    a step may go through a portal. Drop the other colors' blocks and let a color's blocks
+    step any way at every move, and the relaxed problem splits per block: its exact answer
+    is the smallest bottleneck over assignments of blocks to destinations that cover every
+    destination, built from single-block distances. Those distances are what the database
+    stores, one byte per grid for every destination, found by breadth first search over the
+    static layout.
+
+    A color can only vanish or grow by painting, so colors a painter could paint away are
+    left out, and a color a painter can feed only counts its own blocks. The estimates of
+    the colors are combined by their maximum, as one move can serve them all.
+
+    The heuristic is admissible but not consistent: painters change which blocks a color
+    counts from one move to the next, and the estimate can drop by more than the move
+    taken. A* still finds shortest solutions only because
+    `AnytimeSolver.best_first` reopens a state reached again with fewer moves.
+
+    Databases depend only on the layout: they are written to disk under a fingerprint of it
+    and mapped back with `mmap`.
+
+    Usage: python patterns.py board.csv [directory]
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from collections import deque
+
+from solve import DIRECTIONS
+
+_HEADER = struct.Struct('<8sHHH') # magic, height, width, number of tables
+_MAGIC = b'PTSPDB1\0'
+UNREACHABLE = 255
+
+
+def layout_fingerprint(board):
+    """Hex digest of everything but the blocks: size, portals, changers, painters, obstacles, destinations."""
+    layout = '\n'.join(','.join(row) for row in board.board)
+    return hashlib.blake2b(layout.encode('ascii'), digest_size=16).hexdigest()
+
+
+def _cells(board):
+    return [(i, j) for i in range(board.height()) for j in range(board.width())]
+
+
+def distance_table(board, target):
+    """Fewest steps from every grid to target, UNREACHABLE if there is no way, as a flat bytearray."""
+    # Reverse breadth first search on the step graph. Off the board grids, where a portal may
+    # let a block out, are walked through but not stored.
+    standing = [pos for pos in _cells(board) if not board.is_obstacle(pos)]
+    for portals in board.portals.values():
+        for portal in portals:
+            for velocity in ((-1, 0), (0, 1), (0, -1), (1, 0)):
+                standing.append((portal[0] + velocity[0], portal[1] + velocity[1]))
+    predecessors = {}
+    for pos in standing:
+        for towards in DIRECTIONS:
+            try:
+                target_pos = board.step(pos, towards)
+            except (ValueError, IndexError): # a portal without its pair, or letting out where the search breaks
+                continue
+            if target_pos is None or target_pos == pos:
+                continue
+            if 0 <= target_pos[0] < board.height() and 0 <= target_pos[1] < board.width() and board.is_obstacle(target_pos):
+                continue
+            predecessors.setdefault(target_pos, set()).add(pos)
+
+    width = board.width()
+    table = bytearray([UNREACHABLE]) * (board.height() * width)
+    distances = {target: 0}
+    q = deque([target])
+    while q:
+        pos = q.popleft()
+        d = distances[pos]
+        if 0 <= pos[0] < board.height() and 0 <= pos[1] < width:
+            table[pos[0] * width + pos[1]] = min(d, UNREACHABLE - 1)
+        for previous in predecessors.get(pos, ()):
+            if previous not in distances:
+                distances[previous] = d + 1
+                q.append(previous)
+    return table
+
+
+def _matching(candidates, destinations):
+    # Kuhn's augmenting paths: can every destination get its own block among its candidates?
+    owner = {}
+
+    def augment(d, seen):
+        for b in candidates[d]:
+            if b not in seen:
+                seen.add(b)
+                if b not in owner or augment(owner[b], seen):
+                    owner[b] = d
+                    return True
+        return False
+
+    return all(augment(d, set()) for d in destinations)
+
+
+def bottleneck(distances):
+    """
+        distances[b][d] from block b to destination d. The fewest moves after which every
+        block is on a destination and every destination has a block, moving blocks freely.
+    """
+    blocks = range(len(distances))
+    destinations = range(len(distances[0]))
+    for limit in sorted(set(d for row in distances for d in row)):
+        if limit >= UNREACHABLE:
+            break
+        if any(min(row) > limit for row in distances):
+            continue
+        candidates = [[b for b in blocks if distances[b][d] <= limit] for d in destinations]
+        if _matching(candidates, destinations):
+            return limit
+    return None
+
+
+class PatternDatabase:
+
+    def __init__(self, board, tables):
+        self.board = board
+        self.tables = tables # color -> [(destination, table)]
+        self.width = board.width()
+
+        painted = set(color for i, j, color in board.painters)
+        # colors some painter could paint away may be gone at the end, nothing to estimate
+        self.colors = [c for c in sorted(tables) if not painted - set([c])]
+        self.fed = painted # colors painters can give blocks to, their destinations may get those blocks
+
+    @classmethod
+    def build(cls, board):
+        tables = {}
+        for c in sorted(board.colors()):
+            tables[c] = [(pos, distance_table(board, pos)) for pos in sorted(board.destinations(c))]
+        return cls(board, tables)
+
+    def save(self, filename):
+        count = sum(len(entries) for entries in self.tables.values())
+        with open(filename, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, self.board.height(), self.width, count))
+            for c in sorted(self.tables):
+                for pos, table in self.tables[c]:
+                    f.write(table)
+
+    @classmethod
+    def load(cls, board, filename):
+        """Map a saved database, in the order build writes it. Raises ValueError if it is not for this board's size."""
+        with open(filename, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, height, width, count = _HEADER.unpack_from(mapped, 0)
+        expected = sum(len(board.destinations(c)) for c in board.colors())
+        if magic != _MAGIC or (height, width, count) != (board.height(), board.width(), expected):
+            mapped.close()
+            raise ValueError('%s is not a pattern database of this layout' % filename)
+        size = height * width
+        view = memoryview(mapped)
+        offset = _HEADER.size
+        tables = {}
+        for c in sorted(board.colors()):
+            tables[c] = []
+            for pos in sorted(board.destinations(c)):
+                tables[c].append((pos, view[offset:offset + size]))
+                offset += size
+        return cls(board, tables)
+
+    @classmethod
+    def open(cls, board, directory):
+        """Load the database of the board's layout from directory, building and saving it first if needed."""
+        filename = os.path.join(directory, layout_fingerprint(board) + '.pdb')
+        if not os.path.exists(filename):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            partial = filename + '.%d' % os.getpid()
+            cls.build(board).save(partial)
+            os.replace(partial, filename) # concurrent builders write the same bytes, the last rename wins
+        return cls.load(board, filename)
+
+    def distance(self, status, c):
+        height, width = self.board.height(), self.width
+        rows = []
+        for i, j in status.positions(c):
+            if not (0 <= i < height and 0 <= j < width): # off the board, anything is possible
+                return 0
+            rows.append([table[i * width + j] for pos, table in self.tables[c]])
+        if c in self.fed: # blocks painted on the way may cover destinations, only own blocks are bound
+            return max(min(row) for row in rows)
+        return bottleneck(rows)
+
+    def heuristic(self, board, status):
+        """Admissible estimate of the moves left, None when the relaxation shows the state is dead."""
+        h = 0
+        for c in self.colors:
+            if not status.positions(c):
+                continue
+            d = self.distance(status, c)
+            if d is None or d >= UNREACHABLE:
+                return None
+            h = max(h, d)
+        return h
+
+
+def solve_astar(board, directory='.'):
+    """A* with the pattern database heuristic: the shortest solution, often with far fewer states expanded."""
+    from anytime import AnytimeSolver
+    from solve import UnsolvableError, Solution
+
+    solver = AnytimeSolver(board, weights=(1.0,))
+    database = PatternDatabase.open(solver.solver.board, directory)
+    solver.heuristic = database.heuristic
+    found = solver.best_first(1.0)
+    if found is None:
+        raise UnsolvableError()
+    return Solution(found), solver.stats['expanded']
+
+
+if __name__ == '__main__':
+    from cli import format_solution
+    from solve import read_board
+
+    solution, expanded = solve_astar(read_board(sys.argv[1]), sys.argv[2] if len(sys.argv) > 2 else '.')
+    sys.stdout.write('%s\n%d states expanded\n' % (format_solution(solution), expanded))
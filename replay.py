@@ -0,0 +1,83 @@
+"""
+    Replay stored solutions without searching.
+
+    A solution is the string printed by solve.py, one color per move, spaces ignored.
+    `replay` plays it on a single Status with the solver's own `_move` and reports the
+    first move where it goes wrong; `verify_corpus` streams many (board, solution) pairs
+    through a process pool.
+
+    Usage: python replay.py corpus.txt [processes]
+
+    Each corpus line is a board file and its solution, separated by a tab.
+"""
+
+import sys
+from collections import namedtuple
+
+from solve import Solver, read_board
+
+# divergence is the index of the first wrong move, or None when the solution is valid
+Replay = namedtuple('Replay', 'solved divergence reason')
+
+
+def replay(board, moves):
+    solver = Solver(board)
+    status = solver.init_status
+    moves = ''.join(moves.split())
+
+    for index, color in enumerate(moves):
+        if status.finished(solver.board):
+            return Replay(False, index, 'board already finished')
+        if color not in status.colors():
+            return Replay(False, index, 'no block of color %s' % color)
+        status = solver._move(status, color)
+
+    if not status.finished(solver.board):
+        return Replay(False, len(moves), 'board not finished')
+    return Replay(True, None, None)
+
+
+_boards = {} # per process cache, corpora usually hold many solutions of the same board
+
+def _replay_file(item):
+    filename, moves = item
+    if filename not in _boards:
+        _boards[filename] = read_board(filename)
+    return item, replay(_boards[filename], moves)
+
+
+def verify_corpus(pairs, processes=None, chunksize=64):
+    """
+        Replay (board filename, solution) pairs in a process pool, yielding (pair, Replay)
+        in input order, as soon as each one is ready.
+    """
+    from multiprocessing import Pool
+
+    pool = Pool(processes)
+    try:
+        for result in pool.imap(_replay_file, pairs, chunksize):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def read_corpus(filename):
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.strip():
+                board_file, moves = line.rstrip('\n').split('\t')
+                yield board_file.strip(), moves
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    failed = 0
+    total = 0
+    for (board_file, moves), result in verify_corpus(read_corpus(sys.argv[1]), processes):
+        total += 1
+        if not result.solved:
+            failed += 1
+            sys.stdout.write('%s: move %d of "%s": %s\n' % (board_file, result.divergence + 1, moves, result.reason))
+    sys.stdout.write('%d solutions checked, %d failed\n' % (total, failed))
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,92 @@
+"""
+    Rules profiles of the past versions kept in versions/, for the one engine in solve.py.
+
+    Every version changed the rules a little: same color blocks moving together (0.2),
+    obstacles (0.3), any board size (0.4), several portal types (0.5), chains that loop or
+    turn (0.51), painters (0.6). A profile names the grids its version knew as tile
+    handlers, the push chain switches, and what its version refused to load:
+
+        Solver(board, rules=PROFILES['0.3'])
+
+    A new mechanic is a new Tile subclass registered in a profile, not a new copy of the
+    solver. benchmarks/profiles.py checks every profile move for move against its version.
+"""
+
+from solve import (RULES, PORTAL_PREFIX, Rules, DestinationTile, PortalTile, ObstacleTile, ChangerTile)
+
+
+class SingleDestinationTile(DestinationTile):
+    # 0.1: one destination of each color
+
+    def register(self, board, pos, thing):
+        if board.symbols.colors.codes.get(thing[1]) in board.destinations_map:
+            raise ValueError('two destinations of color %s, version 0.1 has one' % thing[1])
+        DestinationTile.register(self, board, pos, thing)
+
+
+class SinglePortalTile(PortalTile):
+    """
+        Before 0.5: one pair of portals. Every grid starting with O is listed as a portal, but
+        only the ones that are exactly O teleport, to the first other portal listed.
+    """
+
+    def register(self, board, pos, thing):
+        board.portals[board.symbols.portals.code('')].append(pos)
+        if thing == PORTAL_PREFIX:
+            board.portal_cells.add(pos)
+
+    def compile(self, board):
+        portals = board.portals.get(board.symbols.portals.codes.get(''), [])
+        for pos in board.portal_cells:
+            others = [portal for portal in portals if portal != pos]
+            if others:
+                board.teleports[pos] = others[0]
+
+
+class UncheckedPortalTile(PortalTile):
+    # 0.5 and 0.51: portal types, but a lone portal or a third one only broke the search once a block went in
+
+    def register(self, board, pos, thing):
+        board.portals[board.symbols.portals.code(thing[1:])].append(pos)
+        board.portal_cells.add(pos)
+
+    def compile(self, board):
+        for portals in board.portals.values():
+            if len(portals) >= 2:
+                board.teleports[portals[0]] = portals[1]
+                board.teleports[portals[1]] = portals[0]
+
+
+class HistoricalRules(Rules):
+    """Rules with the checks a past version made when loading a board."""
+
+    def __init__(self, name, tiles, size=None, single_blocks=False, match_counts=False, **switches):
+        Rules.__init__(self, name, tiles, **switches)
+        self.size = size
+        self.single_blocks = single_blocks
+        self.match_counts = match_counts
+
+    def check(self, board, init_status):
+        if self.size is not None and (board.height(), board.width()) != (self.size, self.size):
+            raise ValueError('version %s only knows %dx%d boards' % (self.name, self.size, self.size))
+        if self.single_blocks and len(init_status.blocks[2::4]) != len(init_status.colors()):
+            raise ValueError('version %s moves one block of each color' % self.name)
+        if init_status.colors() != board.colors():
+            raise ValueError('colors of blocks and destinations differ')
+        if self.match_counts:
+            for c in board.colors():
+                if len(board.destinations(c)) != len(init_status.positions(c)):
+                    raise ValueError('color %s has %d blocks and %d destinations' % (c, len(init_status.positions(c)), len(board.destinations(c))))
+
+
+_BEFORE_051 = dict(loops_move=False, chains_turn=False, sorted_movers=False)
+
+PROFILES = {
+    '0.1': HistoricalRules('0.1', [SingleDestinationTile(), SinglePortalTile(), ChangerTile()], size=5, single_blocks=True, **_BEFORE_051),
+    '0.2': HistoricalRules('0.2', [DestinationTile(), SinglePortalTile(), ChangerTile()], size=5, **_BEFORE_051),
+    '0.3': HistoricalRules('0.3', [DestinationTile(), SinglePortalTile(), ChangerTile(), ObstacleTile()], size=5, **_BEFORE_051),
+    '0.4': HistoricalRules('0.4', [DestinationTile(), SinglePortalTile(), ChangerTile(), ObstacleTile()], match_counts=True, **_BEFORE_051),
+    '0.5': HistoricalRules('0.5', [DestinationTile(), UncheckedPortalTile(), ChangerTile(), ObstacleTile()], match_counts=True, **_BEFORE_051),
+    '0.51': HistoricalRules('0.51', [DestinationTile(), UncheckedPortalTile(), ChangerTile(), ObstacleTile()], match_counts=True, sorted_movers=False),
+    '0.6': RULES,
+}
@@ -0,0 +1,273 @@
+"""
+    Asynchronous solving for asyncio services.
+
+    Searches run in a process pool, so the event loop is never blocked. A worker reports
+    progress (depth reached, states expanded and kept) every few thousand expanded states
+    through a manager queue, and looks at a shared cancel flag at the same time. Requests
+    for the same board and options share one search in flight: its events go to every
+    listener, and it is only cancelled once nobody waits for it any more.
+
+        service = SolveService()
+        solution = await service.solve(board)
+        async for event in service.events(board):
+            ...
+
+    `solve_async` and `solve_events` do the same on a service shared by the process.
+
+    Usage: python service.py board.csv...
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from solve import Solver, Budget
+
+INTERVAL = 2048 # expanded states between progress events and cancel checks
+_POLL = 0.1 # seconds the event pump waits on the queue before it looks at the worker again
+
+
+def board_fingerprint(board, **options):
+    """Hex digest of the board's grids, blocks included, and the solve options."""
+    text = '\n'.join(','.join(row) for row in board) + '\n' + repr(sorted(options.items()))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class _Watch(Budget):
+    # the limits of the request, plus progress events and the cancel flag, looked at every interval expanded states
+
+    def __init__(self, solver, events, cancelled, interval, **limits):
+        Budget.__init__(self, **limits)
+        self.solver = solver
+        self.events = events
+        self.cancelled = cancelled
+        self.interval = interval
+        self.trail = ''
+        self.expanded = 0
+        # counting placed blocks costs about a third of the search; with no limit only a cancel stops it early,
+        # and the best state of one expanded state in every interval is enough
+        self.limited = any(limit is not None for limit in limits.values())
+
+    def record(self, board, status, trail):
+        if self.limited or self.expanded % self.interval == 0:
+            Budget.record(self, board, status, trail)
+        self.trail = trail
+
+    def exceeded(self, states, nbytes):
+        self.expanded += 1
+        if self.expanded % self.interval == 0:
+            if self.cancelled.is_set():
+                return 'cancelled'
+            self.events.put(self.progress(states, nbytes))
+        return Budget.exceeded(self, states, nbytes)
+
+    def progress(self, states, nbytes):
+        # the trail is the path, or a state index in compact mode
+        depth = len(self.trail) if isinstance(self.trail, str) else len(self.solver._trace(self.trail))
+        return {'event': 'progress', 'depth': depth, 'expanded': self.expanded, 'states': states, 'bytes': nbytes,
+                'seconds': time.time() - self.start}
+
+
+def _solve_worker(board, options, events, cancelled, interval):
+    options = dict(options)
+    solver = Solver(board, compact=options.pop('compact', False))
+    limits = dict((name, options.pop(name, None)) for name in ('time_limit', 'max_states', 'max_memory'))
+    watch = _Watch(solver, events, cancelled, interval, **limits)
+    events.put(watch.progress(1, 0))
+    return solver.solve(budget=watch, **options)
+
+
+class _Search:
+    # one search in flight, with everyone who waits for it
+
+    def __init__(self, key):
+        self.key = key
+        self.result = asyncio.get_running_loop().create_future()
+        self.listeners = [] # asyncio.Queue of every events() iterator
+        self.waiters = 0
+        self.cancelled = None
+        self.task = None # the task of SolveService._run, kept so it is not collected halfway
+        self.last = None # the latest progress event, for listeners that come late
+
+    def publish(self, event):
+        if event['event'] == 'progress':
+            self.last = event
+        for listener in self.listeners:
+            listener.put_nowait(event)
+
+
+class SolveService:
+    """
+        A process pool for the searches of one service, with one search in flight per board
+        fingerprint. The pool and the manager process are started here, best before the
+        event loop serves anything, since starting the manager blocks. Close it when the
+        service stops.
+    """
+
+    def __init__(self, processes=None, interval=INTERVAL):
+        self.processes = processes
+        self.interval = interval
+        self.executor = ProcessPoolExecutor(processes)
+        self.manager = multiprocessing.Manager()
+        self.searches = {}
+
+    def _start(self, board, options):
+        if self.executor is None:
+            raise RuntimeError('the service is closed')
+        key = board_fingerprint(board, **options)
+        search = self.searches.get(key)
+        if search is None:
+            search = self.searches[key] = _Search(key)
+            search.cancelled = self.manager.Event()
+            search.task = asyncio.ensure_future(self._run(search, board, options))
+            search.task.add_done_callback(lambda task: self._finished(search, task))
+        return search
+
+    def _finished(self, search, task):
+        # _run hands the search's own error to its waiters; one of _run itself goes to them too
+        if self.searches.get(search.key) is search:
+            del self.searches[search.key]
+        if task.cancelled() or task.exception() is None or search.result.done():
+            return
+        search.publish({'event': 'error', 'error': task.exception()})
+        search.result.set_exception(task.exception())
+        search.result.exception() # retrieved, nobody may be waiting any more
+
+    async def _run(self, search, board, options):
+        loop = asyncio.get_running_loop()
+        events = self.manager.Queue()
+        work = loop.run_in_executor(self.executor, _solve_worker, board, options, events, search.cancelled, self.interval)
+        while True:
+            try:
+                event = await loop.run_in_executor(None, events.get, True, _POLL)
+            except queue.Empty:
+                if work.done():
+                    break
+                continue
+            search.publish(event)
+        if self.searches.get(search.key) is search:
+            del self.searches[search.key]
+        try:
+            result = work.result()
+        except Exception as e:
+            search.publish({'event': 'error', 'error': e})
+            search.result.set_exception(e)
+            search.result.exception() # retrieved, nobody may be waiting any more
+        else:
+            search.publish({'event': 'done', 'result': result})
+            search.result.set_result(result)
+
+    def _leave(self, search):
+        # a waiter or a listener is gone; the last one to go cancels the search
+        if search.waiters == 0 and not search.listeners and not search.result.done():
+            search.cancelled.set()
+            if self.searches.get(search.key) is search:
+                del self.searches[search.key] # a new request starts over rather than join a dying search
+
+    async def solve(self, board, **options):
+        """
+            Solve in the pool: a Solution, or an Incomplete when a limit of options is reached.
+            options are those of Solver.solve, and compact. Cancelling the call cancels the
+            search too, unless others wait for it.
+        """
+        search = self._start(board, options)
+        search.waiters += 1
+        try:
+            return await asyncio.shield(search.result)
+        finally:
+            search.waiters -= 1
+            self._leave(search)
+
+    async def events(self, board, **options):
+        """
+            Progress events of the search for board, as dicts: 'progress' with depth,
+            expanded, states, bytes and seconds, then 'done' with the result or 'error'.
+        """
+        search = self._start(board, options)
+        listener = asyncio.Queue()
+        search.listeners.append(listener)
+        if search.last is not None:
+            listener.put_nowait(search.last)
+        if search.result.done(): # finished between start and now, it will publish nothing more
+            if search.result.exception() is None:
+                listener.put_nowait({'event': 'done', 'result': search.result.result()})
+            else:
+                listener.put_nowait({'event': 'error', 'error': search.result.exception()})
+        try:
+            while True:
+                event = await listener.get()
+                yield event
+                if event['event'] in ('done', 'error'):
+                    return
+        finally:
+            search.listeners.remove(listener)
+            self._leave(search)
+
+    def close(self):
+        for search in list(self.searches.values()):
+            search.cancelled.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.manager.shutdown()
+            self.executor = self.manager = None
+
+
+_service = None
+_starting = None # the service being started in a thread, for the coroutines that need it meanwhile
+
+
+def default_service():
+    """The service shared by the process, started here if it was not yet: call it before the loop serves."""
+    global _service
+    if _service is None:
+        _service = SolveService()
+    return _service
+
+
+async def _shared_service():
+    # the shared service, started in a thread when the loop needs it first
+    global _service, _starting
+    if _service is None:
+        if _starting is None:
+            _starting = asyncio.get_running_loop().run_in_executor(None, default_service)
+        await _starting
+    return _service
+
+
+async def solve_async(board, **options):
+    """Solve board in the shared process pool without blocking the event loop. See SolveService.solve."""
+    return await (await _shared_service()).solve(board, **options)
+
+
+async def solve_events(board, **options):
+    """Async iterator of the progress events of solving board in the shared pool. See SolveService.events."""
+    async for event in (await _shared_service()).events(board, **options):
+        yield event
+
+
+if __name__ == '__main__':
+    from cli import format_solution
+    from solve import read_board
+
+    async def follow(service, filename):
+        async for event in service.events(read_board(filename)):
+            if event['event'] == 'progress':
+                sys.stdout.write('%s: depth %d, %d expanded, %d states, %.1fs\n' % (filename, event['depth'], event['expanded'], event['states'], event['seconds']))
+            elif event['event'] == 'done':
+                result = event['result']
+                sys.stdout.write('%s: %s\n' % (filename, format_solution(result) if result.status == 'solved' else result.status))
+            else:
+                sys.stdout.write('%s: %s\n' % (filename, type(event['error']).__name__))
+
+    async def main(filenames):
+        service = await asyncio.get_running_loop().run_in_executor(None, SolveService)
+        try:
+            await asyncio.gather(*[follow(service, filename) for filename in filenames])
+        finally:
+            service.close()
+
+    asyncio.run(main(sys.argv[1:]))
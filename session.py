@@ -0,0 +1,170 @@
+"""
+    Solver sessions: hints again and again on one level, as the player moves.
+
+    A session keeps what its searches learned about one layout, the board without its
+    blocks. Every expanded state keeps its successors, so a later search walks through the
+    explored region without pushing a single block, and every state on an answered
+    solution keeps the rest of that solution, so asking again from there is answered at
+    once. A search from a state the session knows stops as soon as no shorter solution
+    than one through a state with a known answer can exist, which is still the shortest.
+
+    States are kept in the layers their searches added them in. Past max_states the
+    oldest layers are dropped, the moves of a dropped state are simply pushed again.
+
+    Usage: python session.py board.csv
+"""
+
+import sys
+import time
+from collections import deque
+
+from solve import Solver, UnsolvableError, Solution, DIRECTIONS
+
+
+def _is_block(grid):
+    return grid != '' and grid[0] in DIRECTIONS
+
+
+class SolverSession:
+
+    def __init__(self, board, max_states=1 << 20):
+        self.solver = Solver(board)
+        self.layout = [['' if _is_block(grid) else grid for grid in row] for row in board]
+        self.max_states = max_states
+        self.states = {} # key -> Status, every state the session knows
+        self.successors = {} # key -> ((color, key of the next state), ...), for expanded states
+        self.remaining = {} # key -> moves of a shortest solution from there
+        self.layers = deque() # keys in the order they were added, a list per layer, oldest first
+        self.stats = {'queries': 0, 'instant': 0, 'expanded': 0, 'reused': 0, 'evicted': 0}
+
+    def status_of(self, board):
+        """The state of board, which must have the session's layout, in the session's codes."""
+        if [['' if _is_block(grid) else grid for grid in row] for row in board] != self.layout:
+            raise ValueError('not the layout of this session')
+        status = self.solver.Status(self.solver.board.symbols)
+        for i in range(len(board)):
+            for j in range(len(board[i])):
+                if _is_block(board[i][j]):
+                    status.set(board[i][j][1], (i, j), board[i][j][0])
+        return status
+
+    def _keep(self, layer):
+        # a layer of new keys, then the oldest layers go while there are too many states
+        if layer:
+            self.layers.append(layer)
+        while len(self.states) > self.max_states and len(self.layers) > 1:
+            for key in self.layers.popleft():
+                if self.states.pop(key, None) is not None:
+                    self.stats['evicted'] += 1
+                self.successors.pop(key, None)
+                self.remaining.pop(key, None)
+
+    def _children(self, status, key, added):
+        # the states after each move from status, pushed only if no search expanded it yet
+        children = self.successors.get(key)
+        if children is None:
+            self.stats['expanded'] += 1
+            children = []
+            for color in sorted(status.colors()):
+                child = self.solver._move(status, color)
+                child_key = child.key or child._key()
+                if child_key not in self.states:
+                    self.states[child_key] = child
+                    added.append(child_key)
+                children.append((color, child_key))
+            self.successors[key] = tuple(children)
+            status.forget()
+        else:
+            self.stats['reused'] += 1
+        for color, child_key in children:
+            child = self.states.get(child_key)
+            if child is None: # dropped with an old layer
+                child = self.states[child_key] = self.solver._move(status, color)
+                added.append(child_key)
+            yield color, child_key, child
+
+    def solve(self, query):
+        """
+            Shortest solution from query, a board of the session's layout or a Status made by
+            status_of. Raises UnsolvableError if there is none.
+        """
+        status = self.status_of(query) if isinstance(query, list) else query
+        key = status.key or status._key()
+        self.stats['queries'] += 1
+        if key in self.remaining:
+            self.stats['instant'] += 1
+            return Solution(self.remaining[key])
+
+        board = self.solver.board
+        added = []
+        if key not in self.states:
+            self.states[key] = status
+            added.append(key)
+        parents = {key: None} # key -> (key before, color moved)
+        best = None # (moves, key of the state it goes through, known moves from there), kept should the layer go
+
+        def reached(key, status, depth):
+            if status.finished(board):
+                rest = ''
+            elif key in self.remaining:
+                rest = self.remaining[key]
+            else:
+                return best
+            return (depth + len(rest), key, rest) if best is None or depth + len(rest) < best[0] else best
+
+        best = reached(key, status, 0)
+        layer = [(key, status)]
+        depth = 0
+        while layer and (best is None or depth + 1 < best[0]):
+            next_layer = []
+            for key, status in layer:
+                for color, child_key, child in self._children(status, key, added):
+                    if child_key not in parents:
+                        parents[child_key] = (key, color)
+                        best = reached(child_key, child, depth + 1)
+                        next_layer.append((child_key, child))
+            self._keep(added)
+            added = []
+            layer = next_layer
+            depth += 1
+        self._keep(added)
+        if best is None:
+            raise UnsolvableError()
+
+        # the moves up to the state of best, then its known rest, and the answer for every state on the way
+        length, key, moves = best
+        answered = []
+        while True:
+            self.remaining[key] = moves
+            answered.append(key)
+            if parents[key] is None:
+                break
+            key, color = parents[key]
+            moves = color + moves
+        self._keep(answered)
+        return Solution(moves)
+
+
+if __name__ == '__main__':
+    from cli import format_solution
+    from solve import read_board
+
+    session = SolverSession(read_board(sys.argv[1]))
+    status = session.solver.init_status
+
+    def ask(status, what):
+        start = time.time()
+        solution = session.solve(status)
+        sys.stdout.write('%-24s %8.4fs %s\n' % (what, time.time() - start, format_solution(solution)))
+        return solution
+
+    solution = ask(status, 'start')
+    if solution:
+        # a move off the hint, then the hints along the way
+        other = [color for color in sorted(status.colors()) if color != solution[0]]
+        if other:
+            ask(session.solver._move(status, other[0]), 'after %s instead of %s' % (other[0], solution[0]))
+        for color in solution[:-1]:
+            status = session.solver._move(status, color)
+            ask(status, 'after %s' % color)
+    sys.stdout.write('%r\n' % session.stats)
@@ -4,10 +4,11 @@
 """
 
 import sys
-import string
-from Queue import Queue
-import re
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
+from array import array
+
+import core
 
 """
     # version 0.6
@@ -71,143 +72,411 @@ VELOCITIES = {
             'W': (0, -1),
             'S': (1, 0)
         }
+FACING_VELOCITIES = [VELOCITIES[facing] for facing in DIRECTIONS] # by facing code
 
 class UnsolvableError(Exception):
-    pass
+    def __init__(self, exact=True):
+        Exception.__init__(self)
+        self.exact = exact # False if an approximate search may have pruned the solution
+
+
+class Solution(str):
+    """
+        The moves of a solution, one color per move. `exact` is False when it comes from an
+        approximate search, and may then be longer than the optimal solution.
+    """
+    exact = True
+    status = 'solved'
+
+
+class Incomplete:
+    """
+        What a search stopped by one of its limits got to. status is the limit reached:
+        'time', 'states', 'memory', or whatever else stopped its Budget. best is the moves
+        to the state, among those expanded, with the most blocks on destinations of their
+        color; placed counts those blocks, out of goal destinations. stats are the solver's
+        counters with the states kept, their estimated bytes and the seconds spent.
+    """
+    exact = False
+
+    def __init__(self, status, best, state, placed, goal, stats):
+        self.status = status
+        self.best = best
+        self.state = state
+        self.placed = placed
+        self.goal = goal
+        self.stats = stats
+
+
+class Budget:
+    """
+        Limits of one search, checked once per expanded state. The search tells how many
+        states it keeps and an estimate of their bytes, so memory is never asked of the OS.
+        It also hands over every expanded state, to keep the one closest to the goal.
+        Subclasses may stop a search for reasons of their own: exceeded() returns the name.
+    """
+
+    def __init__(self, time_limit=None, max_states=None, max_memory=None):
+        self.start = time.time()
+        self.deadline = None if time_limit is None else self.start + time_limit
+        self.max_states = max_states
+        self.max_memory = max_memory
+        self.placed = -1
+        self.best = None # (state, whatever the search needs to find its moves again)
+
+    def exceeded(self, states, nbytes):
+        """The limit reached, or None."""
+        if self.max_states is not None and states >= self.max_states:
+            return 'states'
+        if self.max_memory is not None and nbytes >= self.max_memory:
+            return 'memory'
+        if self.deadline is not None and time.time() > self.deadline:
+            return 'time'
+        return None
+
+    def record(self, board, status, trail):
+        placed = status.placed(board)
+        if placed > self.placed:
+            self.placed = placed
+            self.best = (status, trail)
+
+
+class Tile:
+    """
+        Handler of one kind of grid, picked by the grid's first letter. register() records a
+        grid as the board is read, filling the tables the search looks up; compile() runs
+        once the whole board is read, for tables that need all the grids of a kind.
+    """
+    prefix = None
+
+    def register(self, board, pos, thing):
+        pass
+
+    def compile(self, board):
+        pass
+
+
+class DestinationTile(Tile):
+    prefix = DESTINATION_PREFIX
+
+    def register(self, board, pos, thing):
+        board.destinations_map[board.symbols.colors.code(thing[1])].append(pos)
+
+
+class PortalTile(Tile):
+    # portals of a type are named by what follows the prefix, and go in pairs
+    prefix = PORTAL_PREFIX
+
+    def register(self, board, pos, thing):
+        portals = board.portals[board.symbols.portals.code(thing[1:])]
+        if len(portals) == 2:
+            raise ValueError('portal %s at %r: a third grid of its type' % (thing, pos))
+        portals.append(pos)
+        board.portal_cells.add(pos)
+        if len(portals) == 2: # paired as soon as the second one shows up
+            board.teleports[portals[0]] = portals[1]
+            board.teleports[portals[1]] = portals[0]
+
+    def compile(self, board):
+        for name, portals in board.portals.items():
+            if len(portals) != 2:
+                raise ValueError('portal %s%s at %r has no pair' % (PORTAL_PREFIX, board.symbols.portals.names[name], portals[0]))
+
+
+class ObstacleTile(Tile):
+    prefix = OBSTACLE
+
+    def register(self, board, pos, thing):
+        board.obstacles.append(pos)
+        if thing == OBSTACLE:
+            board.blocked.add(pos)
+
+
+class ChangerTile(Tile):
+    prefix = CHANGER_PREFIX
+
+    def register(self, board, pos, thing):
+        if thing[1] not in DIRECTIONS:
+            raise ValueError('changer %s at %r: no such facing' % (thing, pos))
+        board.changers.append((pos[0], pos[1], thing[1]))
+        board.turns[pos] = board.symbols.facings.code(thing[1])
+
+
+class PainterTile(Tile):
+    prefix = PAINTER_PREFIX
+
+    def register(self, board, pos, thing):
+        board.painters.append((pos[0], pos[1], thing[1:]))
+        if thing[1:]: # a bare P paints nothing
+            board.paints[pos] = board.symbols.colors.code(thing[1:])
+
+
+class Rules:
+    """
+        A rules profile: the grids a board may hold, and how push chains behave.
+
+        - loops_move: a chain that runs into itself moves (0.51), rather than stays (before)
+        - chains_turn: a pushed block of the pusher's color goes its own way (0.51)
+        - sorted_movers: blocks of the moved color push in position order, not set order
+
+        check() rejects, with ValueError, boards the profile's version could not load.
+    """
+
+    def __init__(self, name, tiles, loops_move=True, chains_turn=True, sorted_movers=True):
+        self.name = name
+        self.tiles = dict((tile.prefix, tile) for tile in tiles)
+        self.loops_move = loops_move
+        self.chains_turn = chains_turn
+        self.sorted_movers = sorted_movers
+
+    def check(self, board, init_status):
+        pass
+
+
+RULES = Rules('0.6', [DestinationTile(), PortalTile(), ObstacleTile(), ChangerTile(), PainterTile()])
+
+
+class Symbols:
+    """Dense small ints for names, given out as they first show up."""
+    __slots__ = ('codes', 'names')
+
+    def __init__(self, names=()):
+        self.codes = {}
+        self.names = []
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class SymbolTable:
+    """
+        A board's alphabet. Colors, facings and portal names get small ints as the board is
+        read; the tables of the board and the blocks of a status hold those, and names only
+        come back through the public methods, for output.
+    """
+    __slots__ = ('colors', 'facings', 'portals')
+
+    def __init__(self):
+        self.colors = Symbols()
+        self.facings = Symbols(DIRECTIONS) # same codes on every board, FACING_VELOCITIES is indexed by them
+        self.portals = Symbols()
+
 
 class Solver:
 
     class Board:
-        def __init__(self, board_size):
+        __slots__ = ('cells', 'rows', 'columns', 'rules', 'symbols', 'destinations_map', 'portals', 'obstacles', 'changers',
+                     'painters', 'goals', 'portal_cells', 'teleports', 'blocked', 'turns', 'paints', 'steps')
+
+        def __init__(self, board_size, rules=RULES):
             # In input, empty are '' for faster key-typing, in Board representation empty is '.' for better index handling.
             # (TODO): This hack may be fixed after project is finished
-            self.board = [['.' for j in range(board_size)] for i in range(board_size)]
-            self.destinations_map = defaultdict(list)
-            self.portals = defaultdict(list)
+            self.rows = self.columns = board_size
+            self.cells = ['.'] * (board_size * board_size) # row by row
+            self.rules = rules
+            self.symbols = SymbolTable()
+            self.destinations_map = defaultdict(list) # color code -> destinations
+            self.portals = defaultdict(list) # portal name code -> its grids
             self.obstacles = []
             self.changers = []
             self.painters = []
+            # tables the tiles fill, for the search to look grids up
+            self.goals = {} # color code -> frozenset of its destinations, once compiled
+            self.portal_cells = set()
+            self.teleports = {} # portal -> the other portal of its pair
+            self.blocked = set()
+            self.turns = {} # pos -> facing code a block entering it takes
+            self.paints = {} # pos -> color code a block entering it takes
+            self.steps = {} # (pos, facing code) -> grid entered, filled on demand once the board is complete
+
+        @property
+        def board(self):
+            # the grids as rows, a copy
+            return [self.cells[i * self.columns:(i + 1) * self.columns] for i in range(self.rows)]
 
         def height(self):
-            return len(self.board)
+            return self.rows
 
         def width(self):
-            return len(self.board[0])
+            return self.columns
 
         def set(self, i, j, thing):
-            assert self.board[i][j] == '.' # cannot set twice
-            self.board[i][j] = thing
-            if thing[0] == DESTINATION_PREFIX: # A destination
-                color = thing[1]
-                self.destinations_map[color].append((i, j))
-            elif thing[0] == PORTAL_PREFIX:
-                portal_name = thing[1:]
-                self.portals[portal_name].append((i, j))
-            elif thing[0] == OBSTACLE:
-                self.obstacles.append((i, j))
-            elif thing[0] == CHANGER_PREFIX:
-                self.changers.append((i, j, thing[1]))
-            elif thing[0] == PAINTER_PREFIX:
-                self.painters.append((i, j, thing[1:]))
-            else:
-                assert False # should not come here
+            if not (0 <= i < self.rows and 0 <= j < self.columns):
+                raise IndexError('grid %r is out of the board' % ((i, j),))
+            assert self.cells[i * self.columns + j] == '.' # cannot set twice
+            tile = self.rules.tiles.get(thing[0])
+            if tile is None:
+                raise ValueError('no %r grids in version %s' % (thing, self.rules.name))
+            self.cells[i * self.columns + j] = thing
+            tile.register(self, (i, j), thing)
+
+        def compile(self):
+            # once every grid is set
+            for tile in self.rules.tiles.values():
+                tile.compile(self)
+            self.goals = dict((c, frozenset(positions)) for c, positions in self.destinations_map.items())
+            self.obstacles = tuple(self.obstacles)
+            self.changers = tuple(self.changers)
+            self.painters = tuple(self.painters)
+            # A portal by the edge lets blocks out of the board. Grids up or left of it always read as Python
+            # indexes lists, from the other side of the board, so the tables say the same there.
+            for portal in self.teleports.values():
+                for velocity in VELOCITIES.values():
+                    pos = (portal[0] + velocity[0], portal[1] + velocity[1])
+                    if pos[0] < 0 or pos[1] < 0:
+                        wrapped = (pos[0] % self.rows, pos[1] % self.columns)
+                        for table in (self.turns, self.paints):
+                            if wrapped in table:
+                                table[pos] = table[wrapped]
+                        if wrapped in self.blocked:
+                            self.blocked.add(pos)
 
         def get(self, i, j):
-            return self.board[i][j]
+            if not (0 <= i < self.rows and 0 <= j < self.columns):
+                raise IndexError('grid %r is out of the board' % ((i, j),))
+            return self.cells[i * self.columns + j]
 
         def colors(self):
-            return set(self.destinations_map.keys())
+            names = self.symbols.colors.names
+            return set(names[code] for code in self.destinations_map)
 
         def destinations(self, c):
-            return set(self.destinations_map[c])
+            return set(self.destinations_map.get(self.symbols.colors.codes.get(c), ()))
 
         def is_portal(self, pos):
-            return self.board[pos[0]][pos[1]][0] == PORTAL_PREFIX
+            return pos in self.portal_cells
 
         def is_obstacle(self, pos):
-            return self.board[pos[0]][pos[1]] == OBSTACLE
+            return pos in self.blocked
 
         def get_another_portal(self, pos):
-            for portal_name in self.portals.keys():
-                portals = self.portals[portal_name]
-                if pos == portals[0]:
-                    return portals[1]
-                if pos == portals[1]:
-                    return portals[0]
-            
-            raise ValueError()
+            # a dict lookup, portals are paired as they are set
+            other_portal = self.teleports.get(pos)
+            if other_portal is None:
+                raise ValueError()
+            return other_portal
+
+        def step(self, pos, towards):
+            # the grid a block at pos enters when pushed towards, after teleporting. None if it would leave the board.
+            return self._step(pos, self.symbols.facings.codes[towards])
+
+        def _step(self, pos, towards):
+            # step with the facing code
+            key = (pos, towards)
+            if key not in self.steps:
+                velocity = FACING_VELOCITIES[towards]
+                target_pos = (pos[0] + velocity[0], pos[1] + velocity[1])
+                if not (0 <= target_pos[0] < self.rows and 0 <= target_pos[1] < self.columns):
+                    target_pos = None
+                elif self.is_portal(target_pos): # Teleport if meets portal
+                    other_portal = self.get_another_portal(target_pos)
+                    target_pos = (other_portal[0] + velocity[0], other_portal[1] + velocity[1])
+                    if target_pos[0] >= self.rows or target_pos[1] >= self.columns: # no such grid to read, as ever
+                        raise IndexError('portal %r lets blocks out of the board' % (other_portal,))
+                self.steps[key] = target_pos
+            return self.steps[key]
 
         def get_facing_change_by_position(self, pos):
-            grid = self.board[pos[0]][pos[1]]
-            if grid[0] == CHANGER_PREFIX:
-                return grid[1]
-            else:
-                return None
+            code = self.turns.get(pos)
+            return None if code is None else self.symbols.facings.names[code]
 
         def get_painted_color_by_position(self, pos):
-            grid = self.board[pos[0]][pos[1]]
-            if grid[0] == PAINTER_PREFIX:
-                return grid[1:]
-            else:
-                return None
+            code = self.paints.get(pos)
+            return None if code is None else self.symbols.colors.names[code]
 
 
     class Status:
-
-        def __init__(self):
-            self.pos = defaultdict(list)
-            self.facing_map = {} # since there are several blocks of a color, this changes to map pos -> facing
+        """
+            Blocks as one flat array of (row, column, color code, facing code), in the order
+            they were set, with the codes of the board's symbol table. Positions are tuples as
+            ever, off the board too, where portals let blocks out.
+        """
+        __slots__ = ('symbols', 'blocks', 'grid', 'facings', 'key')
+
+        def __init__(self, symbols):
+            self.symbols = symbols
+            self.blocks = array('h')
+            self.grid = None # pos -> color code, built on demand
+            self.facings = None # pos -> facing code, the last block set there wins
+            self.key = None # canonical bytes for == and hash, built on demand
 
         def set(self, color, pos, facing):
-            self.pos[color].append(pos)
-            self.facing_map[pos] = facing
+            self._set(self.symbols.colors.code(color), pos, self.symbols.facings.codes[facing])
+
+        def _set(self, color, pos, facing):
+            self.blocks.extend((pos[0], pos[1], color, facing))
+            self.grid = self.key = None
+
+        def _color_codes(self):
+            # color codes in the order each color was first set
+            return list(dict.fromkeys(self.blocks[2::4]))
 
         def colors(self):
-            return set(self.pos.keys())
+            names = self.symbols.colors.names
+            return set(names[code] for code in dict.fromkeys(self.blocks[2::4]))
+
+        def _index(self):
+            self.grid, self.facings = core.index(self.blocks)
 
         def facing(self, pos):
-            return self.facing_map[pos]
+            return self.symbols.facings.names[self._facing(pos)]
+
+        def _facing(self, pos):
+            if self.grid is None:
+                self._index()
+            return self.facings[pos]
+
+        def _positions(self, code):
+            return core.positions(self.blocks, code)
 
         def positions(self, c):
-            return set(self.pos[c])
+            return self._positions(self.symbols.colors.codes.get(c))
 
         def finished(self, board):
-            for c in self.colors():
-                if self.positions(c) != board.destinations(c):
-                    return False
-            return True
+            return core.finished(self.blocks, board.goals)
+
+        def placed(self, board):
+            # blocks on a destination of their color, how close to finished the state is
+            goals = board.goals
+            return sum(len(self._positions(code) & goals.get(code, frozenset())) for code in dict.fromkeys(self.blocks[2::4]))
 
         def get_color_from_position(self, pos):
-            for c in self.pos.keys():
-                if pos in self.positions(c):
-                    return c
-            return None
+            code = self._color(pos)
+            return None if code is None else self.symbols.colors.names[code]
+
+        def _color(self, pos):
+            if self.grid is None:
+                self._index()
+            return self.grid.get(pos)
+
+        def forget(self):
+            # drop what was built on demand, the blocks are enough to build it again
+            self.grid = self.facings = None
+
+        def _key(self):
+            # same colors, same positions of each color, same facing in each grid
+            self.key = core.state_key(self.blocks)
+            return self.key
 
         def __eq__(self, o):
-            if self.colors() != o.colors():
-                return False
-            for c in self.colors():
-                if self.positions(c) != o.positions(c):
-                    return False
-                for pos in self.positions(c):
-                    if self.facing(pos) != o.facing(pos):
-                        return False
-            return True
+            return (self.key or self._key()) == (o.key or o._key())
 
         def __hash__(self):
-            v = 7
-            for c in self.colors():
-                for pos in sorted(self.positions(c)):
-                    v = (v << 3) ^ hash(pos) + (hash(self.facing(pos)) << 1)
-            return v
+            return hash(self.key or self._key())
 
 
-    def __init__(self, board):
+    def __init__(self, board, compact=False, mmap_dir=None, rules=RULES):
         assert len(board[0]) == len(board[1]) == len(board[2]) == len(board[3]) == len(board[4])
 
-        init_status = self.Status()
-
-        self.board = self.Board(len(board))
+        self.rules = rules
+        self.board = self.Board(len(board), rules)
+        init_status = self.Status(self.board.symbols)
         for i in range(len(board)):
             for j in range(len(board[i])):
                 grid = board[i][j]
@@ -217,30 +486,39 @@ class Solver:
                     color = grid[1]
                     facing = grid[0]
                     init_status.set(color, (i, j), facing)
-                elif grid[0] == PORTAL_PREFIX: # portal
-                    self.board.set(i, j, grid)
-                elif grid[0] == OBSTACLE: # obstacle
+                else: # portal, obstacle, destination, changer, painter, whatever the rules know
                     self.board.set(i, j, grid)
-                elif grid[0] == DESTINATION_PREFIX: # destination
-                    self.board.set(i, j, grid)
-                elif grid[0] == CHANGER_PREFIX: # face changer
-                    self.board.set(i, j, grid)
-                elif grid[0] == PAINTER_PREFIX: # painter grid
-                    self.board.set(i, j, grid)
-                else:
-                    assert False # Should not come here
+        self.board.compile()
 
         # assert self.validate(self.board, init_status)
         # (TODO): Since color can change, not validating any more for now. Will come up with another valid validation.
-
-        self.q = Queue()
-        self.q.put(init_status)
-
-        self.visited = set()
-        self.visited.add(init_status)
-
-        self.path = {}
-        self.path[init_status] = ""
+        rules.check(self.board, init_status)
+
+        self.init_status = init_status
+        self.compact = compact
+
+        # moves and the plain search run in core, compiled if it was built; subclasses resolving push chains
+        # their own way keep to the methods
+        board = self.board
+        self.engine = core.Engine(board.rows, board.columns, board.symbols.colors.names, board._step, board.turns, board.paints,
+                                  board.blocked, rules.loops_move, rules.chains_turn, rules.sorted_movers)
+        self.native = type(self)._push_forward is Solver._push_forward
+
+        self.stats = {'expanded': 0}
+
+        if compact:
+            # visited states are packed keys, and the path is kept as parent pointers next to them
+            from visited import StatePacker, PackedStateSet
+            self.packer = StatePacker(self.board, init_status)
+            self.visited = PackedStateSet(self.packer.width, mmap_dir=mmap_dir)
+            self.visited.add(self.packer.pack(init_status))
+            self.parents = array('i', [-1])
+            self.moves = bytearray(1) # color index of the move that reached each state
+            # The states waiting, in the order they were added, as records of a block count and the blocks. Not
+            # their keys: which color shows where blocks merged depends on the order of the blocks, keys drop it.
+            self.frontier = array('h', [len(init_status.blocks)]) + init_status.blocks
+        else:
+            self.visited = {init_status._key(): ""} # key -> moves to the state
 
     def validate(self, board, status):
         if board.colors() != status.colors():
@@ -250,104 +528,273 @@ class Solver:
                 return False
         return True
 
-    def _push_forward(self, pos, towards, original_status, new_status, pos_in_chain, pushed_grids, original_color):
-        if pos in pos_in_chain: # I can move it if it's in a loop. Actually I'm guaranteed to be able to.
-            return True
-        pos_in_chain.add(pos)
-        # If there are other blocks on the way of the block we want to push, all of them will be pushed forward one step.
-        # So we first need to find out all the blocks will be push forward, put them into a stack
-
-        velocity = VELOCITIES[towards]
-        color = original_status.get_color_from_position(pos)
-        facing = original_status.facing(pos)
-
-        target_pos = (pos[0] + velocity[0], pos[1] + velocity[1])
-
-        if 0 <= target_pos[0] < self.board.height() and 0 <= target_pos[1] < self.board.width():
-            if self.board.is_portal(target_pos): # Teleport if meets portal
-                other_portal = self.board.get_another_portal(target_pos)
-                target_pos = (other_portal[0] + velocity[0], other_portal[1] + velocity[1])
-
-            if original_status.get_color_from_position(target_pos) and \
-                original_status.get_color_from_position(target_pos) not in pushed_grids: # there is a preceding block, and not already moved
-                preceding_exist = True
-
-                # to fix #5, if a block of the same color in the chain wants to move to a different direction, let it.
-                if original_status.get_color_from_position(target_pos) == color:
-                    new_towards = original_status.facing(target_pos)
-                else:
-                    new_towards = towards
-                # but of course the new direction can't be opposite of the original direction.
-                if (VELOCITIES[towards][0] + VELOCITIES[new_towards][0], VELOCITIES[towards][1] + VELOCITIES[new_towards][1]) == (0, 0):
-                    preceding_removed = False
-                else:
-                    preceding_removed = self._push_forward(target_pos, new_towards, original_status, new_status, pos_in_chain, pushed_grids, original_color)
-            elif self.board.is_obstacle(target_pos): # there is an obstacle
-                preceding_exist = True
-                preceding_removed = False
-            else: # nothing in the way
-                preceding_exist = False
-
-            if not preceding_exist or preceding_exist and preceding_removed: # removed obstacles, now can move me
-                # see if facing changed
-                new_facing = self.board.get_facing_change_by_position(target_pos) or facing
-                new_color = self.board.get_painted_color_by_position(target_pos) or color
-                new_status.set(new_color, target_pos, new_facing)
-                pushed_grids.add(pos)
-                return True
-            else: # preceding failed, unmove
-                new_status.set(color, pos, facing)
-                return False
-        else: # out of bound, unmove.
-            new_status.set(color, pos, facing)
-            return False
+    def enterable(self, pos):
+        # Whether any block could ever move into pos: some grid it could stand on steps into it, from any direction.
+        # Blocks can stand on every grid but obstacles, and off the board where a portal lets them out.
+        board = self.board
+        standing = [(i, j) for i in range(board.height()) for j in range(board.width()) if not board.is_obstacle((i, j))]
+        for portals in board.portals.values():
+            for portal in portals:
+                for velocity in VELOCITIES.values():
+                    exit_pos = (portal[0] + velocity[0], portal[1] + velocity[1])
+                    if not (0 <= exit_pos[0] < board.height() and 0 <= exit_pos[1] < board.width()):
+                        standing.append(exit_pos)
+        for p in standing:
+            for towards in DIRECTIONS:
+                try:
+                    if board.step(p, towards) == pos:
+                        return True
+                except (ValueError, IndexError): # a portal without its pair or out of the board, no block gets through
+                    pass
+        return False
+
+    def precheck(self):
+        """
+            Static invariants every solution needs, checked in a few milliseconds. Raises
+            UnsolvableError when one of them proves the board unsolvable.
+
+            Blocks only change color on painters, so a color that no painter can paint away
+            is still on the board at the end, and needs its destinations. Blocks are never
+            created: a color nothing paints to ends with at most the blocks it starts with,
+            and all forced colors together with at most all the blocks. A destination
+            nothing can enter must hold a block of its color from the start.
+        """
+        board = self.board
+        status = self.init_status
+        painted = set(color for i, j, color in board.painters)
+        blocks = sum(len(status.positions(c)) for c in status.colors())
+
+        forced = [c for c in status.colors() if not painted - set([c])]
+        needed = 0
+        for c in forced:
+            destinations = board.destinations(c)
+            if not destinations:
+                raise UnsolvableError()
+            if c not in painted and len(destinations) > len(status.positions(c)):
+                raise UnsolvableError()
+            needed += len(destinations)
+            for pos in destinations:
+                if status.get_color_from_position(pos) != c and not self.enterable(pos):
+                    raise UnsolvableError()
+        if needed > blocks:
+            raise UnsolvableError()
 
-    def _move(self, status, color):
-        positions = status.positions(color)
-        new_status = self.Status()
+    def _push_forward(self, pos, towards, original_status, new_status, pos_in_chain, pushed_grids, original_color):
+        # If there are other blocks on the way of the block we want to push, all of them will be pushed forward one step,
+        # or none of them: see Engine.push_forward. Colors and facings are codes of the board's symbol table from here on.
+        can_move = self.engine.push_forward(pos, towards, original_status.blocks, new_status.blocks, pos_in_chain)
+        new_status.grid = new_status.key = None
+        return can_move
+
+    def _push_all(self, status, color, new_status):
+        # Push every block of color (a code), writing the blocks of all push chains to new_status. Returns the positions in chains.
+        if self.native:
+            return self.engine.push_all(status.blocks, color, new_status.blocks)
+        positions = status._positions(color)
         pos_in_chain = set()
         pushed_grids = set() # to fix #1
 
         # (HACK): This version (0.2) push the blocks one by one, with the assumption that no 2 blocks will be interested in pushing a same block.
         # This may break with some data, but because its uncertain what the rule is for those situations, the algorithm just leave it for now.
         # This will be fixed if it ever breaks.
-        for pos in positions:
+        # Pushing order matters in those cases, so go in a fixed order instead of the set's, which differs between Python versions.
+        for pos in (sorted(positions) if self.rules.sorted_movers else positions):
             if pos not in pos_in_chain:
-                facing = status.facing(pos)
+                facing = status._facing(pos)
                 self._push_forward(pos, facing, status, new_status, pos_in_chain, pushed_grids, color)
 
-        # copy all the unmoved blocks
-        for c in status.colors():
-            for pos in status.positions(c):
-                if pos not in pos_in_chain:
-                    new_status.set(c, pos, status.facing(pos))
+        return pos_in_chain
 
+    def _move(self, status, color):
+        color = self.board.symbols.colors.codes.get(color)
+        new_status = self.Status(self.board.symbols)
+        if self.native:
+            new_status.blocks = self.engine.move(status.blocks, color)
+            return new_status
+
+        pos_in_chain = self._push_all(status, color, new_status)
+        # copy all the unmoved blocks
+        self.engine.copy_unmoved(status.blocks, pos_in_chain, new_status.blocks)
+        new_status.grid = new_status.key = None
         return new_status
 
-    def solve(self):
-        while not self.q.empty():
-            status = self.q.get()
+    def _status(self, blocks):
+        status = self.Status(self.board.symbols)
+        status.blocks = blocks
+        return status
+
+    def solve(self, approximate=False, error_rate=0.001, capacity=1 << 20, time_limit=None, max_states=None, max_memory=None,
+              budget=None):
+        """
+            Breadth first search for the shortest solution.
+
+            With approximate=True, visited states go to a Bloom filter sized for capacity
+            states at the given false positive rate. It is much smaller, but a false positive,
+            and only that, drops a new state, so the solution may not be the shortest and UnsolvableError
+            may be wrong; both carry exact=False.
+
+            time_limit in seconds, max_states kept and max_memory in bytes, estimated from the
+            states kept, bound the search. Reaching one returns an Incomplete with the best
+            progress so far instead of a Solution. A Budget of one's own, passed as budget,
+            is checked instead.
+        """
+        self.precheck()
+        if budget is None and (time_limit is not None or max_states is not None or max_memory is not None):
+            budget = Budget(time_limit, max_states, max_memory)
+        if approximate:
+            return self._solve_approximate(error_rate, capacity, budget)
+        if self.compact:
+            return self._solve_compact(budget)
+
+        if not self.native:
+            return self._solve_moves(budget)
+        check = None
+        sizes = {} # depth -> (bytes of a visited state, of a waiting one), states of a layer are all about the same size
+        nbytes = 0
+        if budget is not None:
+            def check(blocks, path, states, waiting):
+                nonlocal nbytes
+                status = self._status(blocks)
+                if len(path) not in sizes:
+                    key = sys.getsizeof(status._key())
+                    sizes[len(path)] = (key + sys.getsizeof('') + len(path) + 96, sys.getsizeof(blocks) + 64)
+                visited_bytes, waiting_bytes = sizes[len(path)]
+                budget.record(self.board, status, path)
+                nbytes = states * visited_bytes + waiting * waiting_bytes
+                return budget.exceeded(states, nbytes)
+
+        expanded = self.engine.expanded
+        path, stopped = self.engine.search(self.init_status.blocks, self.board.goals, self.board.symbols.colors.names,
+                                           self.visited, check)
+        self.stats['expanded'] += self.engine.expanded - expanded
+        if stopped is not None:
+            return self._incomplete(stopped, budget, len(self.visited), nbytes)
+        if path is None:
+            raise UnsolvableError()
+        return Solution(path)
+
+    def _solve_moves(self, budget=None):
+        # the same search through _move, for push chains resolved by a subclass
+        q = deque([(self.init_status, "")])
+        state_bytes = self._state_bytes(self.init_status, 0)
+        while q:
+            status, path = q.popleft()
+            if status.finished(self.board):
+                return Solution(path)
+            else:
+                if budget is not None:
+                    budget.record(self.board, status, path)
+                    stopped = budget.exceeded(len(self.visited), len(self.visited) * (state_bytes + len(path)))
+                    if stopped:
+                        return self._incomplete(stopped, budget, len(self.visited), len(self.visited) * (state_bytes + len(path)))
+                self.stats['expanded'] += 1
+                for next_move_color in sorted(status.colors()):
+                    new_status = self._move(status, next_move_color)
+                    key = new_status._key()
+                    if key not in self.visited:
+                        q.append((new_status, path + next_move_color))
+                        self.visited[key] = path + next_move_color
+                status.forget() # expanded, it is only looked up from now on
+
+        raise UnsolvableError()
+
+    def _state_bytes(self, status, moves):
+        # A kept state: the Status with its blocks and key, its path of moves, and the set, dict and queue slots
+        # pointing at them, spare room included.
+        return (sys.getsizeof(status) + sys.getsizeof(status.blocks) + sys.getsizeof(status.key or status._key())
+                + sys.getsizeof('') + moves + 96)
+
+    def _incomplete(self, stopped, budget, states, nbytes, trace=None):
+        status, trail = budget.best
+        stats = dict(self.stats, states=states, bytes=nbytes, seconds=time.time() - budget.start)
+        goal = sum(len(goal) for goal in self.board.goals.values())
+        return Incomplete(stopped, trail if trace is None else trace(trail), status, budget.placed, goal, stats)
+
+    def _trace(self, index):
+        # the moves to the state of index, from the parent pointers of compact mode
+        colors = self.packer.colors
+        path = []
+        while index > 0:
+            path.append(colors[self.moves[index]])
+            index = self.parents[index]
+        return ''.join(reversed(path))
+
+    def _solve_compact(self, budget=None):
+        frontier = self.frontier
+        head = 0 # where the record of the next state starts
+        index = 0 # of the state at head, states wait in the order they got their indexes
+        while head < len(frontier):
+            end = head + 1 + frontier[head]
+            status = self._status(frontier[head + 1:end])
+            head = end
+            if head >= 1 << 16 and head * 2 >= len(frontier): # the records expanded already go
+                del frontier[:head]
+                head = 0
             if status.finished(self.board):
-                return self.path[status]
+                return Solution(self._trace(index))
             else:
-                for next_move_color in status.colors():
+                if budget is not None:
+                    budget.record(self.board, status, index)
+                    nbytes = (self.visited.nbytes() + self.parents.itemsize * len(self.parents) + len(self.moves)
+                              + frontier.itemsize * (len(frontier) - head))
+                    stopped = budget.exceeded(len(self.visited), nbytes)
+                    if stopped:
+                        return self._incomplete(stopped, budget, len(self.visited), nbytes, self._trace)
+                self.stats['expanded'] += 1
+                for next_move_color in sorted(status.colors()):
                     new_status = self._move(status, next_move_color)
-                    if new_status not in self.visited:
-                        self.q.put(new_status)
-                        self.visited.add(new_status)
-                        self.path[new_status] = self.path[status] + next_move_color
+                    if self.visited.add(self.packer.pack(new_status)):
+                        frontier.append(len(new_status.blocks))
+                        frontier.extend(new_status.blocks)
+                        self.parents.append(index)
+                        self.moves.append(self.packer.color_index[next_move_color])
+            index += 1
 
         raise UnsolvableError()
 
+    def _solve_approximate(self, error_rate, capacity, budget=None):
+        from visited import StatePacker, BloomFilter
+        packer = StatePacker(self.board, self.init_status)
+        self.visited = BloomFilter(capacity, error_rate)
+        self.visited.add(packer.pack(self.init_status))
+
+        # the filter can't hold paths, so they travel with the states in the queue
+        q = deque([(self.init_status, "")])
+        while q:
+            status, path = q.popleft()
+            if status.finished(self.board):
+                solution = Solution(path)
+                solution.exact = False
+                return solution
+            else:
+                if budget is not None:
+                    budget.record(self.board, status, path)
+                    nbytes = self.visited.nbytes() + len(q) * self._state_bytes(status, len(path))
+                    stopped = budget.exceeded(len(self.visited), nbytes)
+                    if stopped:
+                        return self._incomplete(stopped, budget, len(self.visited), nbytes)
+                self.stats['expanded'] += 1
+                for next_move_color in sorted(status.colors()):
+                    new_status = self._move(status, next_move_color)
+                    if self.visited.add(packer.pack(new_status)):
+                        q.append((new_status, path + next_move_color))
+
+        raise UnsolvableError(exact=False)
+
 
 def read_board(filename):
     with open(filename, 'r') as f:
         lines = f.readlines()
-        return [map(lambda x:x.strip().upper(), line.split(',')) for line in lines][:-1] # omit the ending empty line
+        return [[x.strip().upper() for x in line.split(',')] for line in lines][:-1] # omit the ending empty line
 
 
-if __name__ == '__main__':
-        solver = Solver(read_board(sys.argv[1]))
-        solution = solver.solve()
-        print ' '.join(re.findall('\w{1,4}', solution))
+def write_board(board, filename):
+    with open(filename, 'w') as f:
+        for row in board:
+            f.write(','.join(row) + '\n')
+        f.write('\n') # the ending empty line read_board omits
 
+
+if __name__ == '__main__':
+    from cli import main
+    main()
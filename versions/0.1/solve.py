@@ -5,7 +5,7 @@
 
 import sys
 import string
-from Queue import Queue
+from queue import Queue
 import re
 
 """
@@ -269,9 +269,9 @@ class Solver:
 
 if __name__ == '__main__':
     with open(sys.argv[1], 'r') as f:
-        board = [map(lambda x:x.strip().upper(), f.readline().split(',')) for i in range(5)]
+        board = [[x.strip().upper() for x in f.readline().split(',')] for i in range(5)]
         solver = Solver(board)
 
         solution = solver.solve()
-        print ' '.join(re.findall('\w{1,4}', solution))
+        print(' '.join(re.findall(r'\w{1,4}', solution)))
 
@@ -5,7 +5,7 @@
 
 import sys
 import string
-from Queue import Queue
+from queue import Queue
 import re
 from collections import defaultdict
 
@@ -326,9 +326,9 @@ if __name__ == '__main__':
     with open(sys.argv[1], 'r') as f:
         lines = f.readlines()
 
-        board = [map(lambda x:x.strip().upper(), line.split(',')) for line in lines][:-1] # omit the ending empty line
+        board = [[x.strip().upper() for x in line.split(',')] for line in lines][:-1] # omit the ending empty line
         solver = Solver(board)
 
         solution = solver.solve()
-        print ' '.join(re.findall('\w{1,4}', solution))
+        print(' '.join(re.findall(r'\w{1,4}', solution)))
 
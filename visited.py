@@ -0,0 +1,237 @@
+"""
+    Compact visited set for the solver.
+
+    A `Status` costs hundreds of bytes once its dicts, lists and tuples are counted. Here a
+    state is packed into a fixed-width byte key (a dozen bits or so per block), keys are
+    appended to one preallocated buffer and found again through an open-addressing table of
+    32-bit references into that buffer. Both buffers grow automatically, and can live in
+    temporary files mapped with `mmap` so the OS is free to page cold states out.
+
+    For quick triage there is also a Bloom filter, which trades a small rate of states
+    wrongly taken as visited for a fixed, much smaller footprint.
+"""
+
+import math
+import mmap
+import struct
+import tempfile
+import zlib
+
+from solve import DIRECTIONS, VELOCITIES
+
+_REF = struct.Struct('<I')
+
+
+class StatePacker:
+    """
+        Packs a Status into a fixed-width key, block by block: every color in every grid
+        becomes one number of the grid, the color and the facing set last in the grid, and
+        the numbers are sorted and laid end to end, one slot for each block of the initial
+        state. Blocks merge but never split, so no state needs more slots, and the empty
+        ones are 0. Blocks merged in one grid and blocks a portal lets out above or left of
+        the board are packed like any other, so every state the solver can reach has a key,
+        and two states have the same key exactly when their Status keys match.
+    """
+
+    def __init__(self, board, init_status):
+        colors = set(board.colors()) | init_status.colors()
+        colors |= set(color for i, j, color in board.painters)
+        self.colors = sorted(colors)
+        self.color_index = dict((c, k) for k, c in enumerate(self.colors))
+
+        # the grids row by row, then the ones up or left of the board a portal exit is on
+        self.cells = dict(((i, j), i * board.width() + j) for i in range(board.height()) for j in range(board.width()))
+        outside = set()
+        for portal in board.teleports:
+            for velocity in VELOCITIES.values():
+                pos = (portal[0] + velocity[0], portal[1] + velocity[1])
+                if pos[0] < 0 or pos[1] < 0:
+                    outside.add(pos)
+        for pos in sorted(outside):
+            self.cells[pos] = len(self.cells)
+        self.positions = sorted(self.cells, key=self.cells.get) # cell -> pos
+
+        self.slots = len(init_status.blocks) // 4
+        # a block is 1 + (cell, color, facing) numbered, 0 is an empty slot
+        self.bits = (len(self.cells) * len(self.colors) * len(DIRECTIONS)).bit_length()
+        self.width = max(1, (self.slots * self.bits + 7) // 8) # key width in bytes
+
+    def pack(self, status):
+        blocks = status.blocks
+        names = status.symbols.colors.names
+        cells = self.cells
+        color_index = self.color_index
+        colors = len(self.colors)
+        facings = {} # cell -> the facing set last there
+        placed = set() # cell and color
+        for k in range(0, len(blocks), 4):
+            pos = (blocks[k], blocks[k + 1])
+            cell = cells.get(pos)
+            if cell is None:
+                raise ValueError('no grid to pack at %r' % (pos,))
+            placed.add(cell * colors + color_index[names[blocks[k + 2]]])
+            facings[cell] = blocks[k + 3]
+        if len(placed) > self.slots:
+            raise ValueError('%d blocks to pack in %d slots' % (len(placed), self.slots))
+        value = 0
+        bits = self.bits
+        for block in sorted(placed):
+            value = value << bits | (block << 2 | facings[block // colors]) + 1
+        return value.to_bytes(self.width, 'little')
+
+    def unpack(self, key, status):
+        """
+            Fill an empty Status with the blocks stored in key. Where colors merged, the
+            one that shows can differ from the packed state's, which depended on the order
+            its blocks were set in.
+        """
+        value = int.from_bytes(key, 'little')
+        mask = (1 << self.bits) - 1
+        while value:
+            block = (value & mask) - 1
+            value >>= self.bits
+            cell, color = divmod(block >> 2, len(self.colors))
+            status.set(self.colors[color], self.positions[cell], DIRECTIONS[block & 3])
+        return status
+
+
+class PackedStateSet:
+    """
+        Set of fixed-width byte keys. Every key gets a dense index in insertion order, so
+        callers can keep per-state data (parents, moves) in flat arrays next to it.
+    """
+
+    MAX_LOAD = 0.75
+
+    def __init__(self, width, capacity=1 << 10, mmap_dir=None):
+        self.width = width
+        self.mmap_dir = mmap_dir
+        self.count = 0
+        self.capacity = capacity
+        self.keys = self._allocate(capacity * width)
+
+        self.slots = 1
+        while self.slots * self.MAX_LOAD < capacity:
+            self.slots <<= 1
+        self.table = self._allocate(self.slots * _REF.size)
+
+    def _allocate(self, size):
+        if self.mmap_dir is None:
+            return bytearray(size)
+        backing = tempfile.TemporaryFile(dir=self.mmap_dir)
+        backing.truncate(size)
+        mapped = mmap.mmap(backing.fileno(), size)
+        backing.close() # the mapping keeps the file alive
+        return mapped
+
+    def _release(self, buf):
+        if self.mmap_dir is not None:
+            buf.close()
+
+    def _find(self, key):
+        """Return (index, slot): the key's index or -1, and the slot it is or would be in."""
+        mask = self.slots - 1
+        slot = zlib.crc32(key) & mask
+        width = self.width
+        while True:
+            ref = _REF.unpack_from(self.table, slot * _REF.size)[0]
+            if ref == 0:
+                return -1, slot
+            offset = (ref - 1) * width
+            if self.keys[offset:offset + width] == key:
+                return ref - 1, slot
+            slot = (slot + 1) & mask
+
+    def _grow_keys(self):
+        # by half, the keys are most of the memory; copied through a view, with no bytes in between
+        capacity = self.capacity + self.capacity // 2
+        keys = self._allocate(capacity * self.width)
+        with memoryview(self.keys) as view:
+            keys[:self.count * self.width] = view[:self.count * self.width]
+        self._release(self.keys)
+        self.keys = keys
+        self.capacity = capacity
+
+    def _grow_table(self):
+        self._release(self.table)
+        self.slots *= 2
+        self.table = self._allocate(self.slots * _REF.size)
+        for index in range(self.count):
+            slot = self._find(self.key(index))[1]
+            _REF.pack_into(self.table, slot * _REF.size, index + 1)
+
+    def add(self, key):
+        """Add key, returning True if it was not in the set yet."""
+        index, slot = self._find(key)
+        if index >= 0:
+            return False
+        if self.count == self.capacity:
+            self._grow_keys()
+        offset = self.count * self.width
+        self.keys[offset:offset + self.width] = key
+        self.count += 1
+        _REF.pack_into(self.table, slot * _REF.size, self.count)
+        if self.count > self.slots * self.MAX_LOAD:
+            self._grow_table()
+        return True
+
+    def index(self, key):
+        return self._find(key)[0]
+
+    def key(self, index):
+        return bytes(self.keys[index * self.width:(index + 1) * self.width])
+
+    def __contains__(self, key):
+        return self._find(key)[0] >= 0
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        """Exact size of the key buffer and the hash table, in bytes."""
+        return len(self.keys) + len(self.table)
+
+
+class BloomFilter:
+    """
+        Probabilistic set of byte keys sized for capacity keys at the given false positive
+        rate. A false positive makes the solver treat a new state as visited.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(float(self.bits) / capacity * math.log(2))))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        h1 = zlib.crc32(key)
+        h2 = zlib.crc32(key, h1) | 1 # double hashing, odd so it never degenerates
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, key):
+        """Add key, returning True if it was definitely not in the filter yet."""
+        added = False
+        for position in self._positions(key):
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self.array[byte] & bit:
+                self.array[byte] |= bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key):
+        for position in self._positions(key):
+            if not self.array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return len(self.array)